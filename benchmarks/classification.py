@@ -0,0 +1,97 @@
+"""Benchmark contract classification with and without the call cache.
+
+Starts the local StarkNet JSON-RPC stand-in with scripted ERC-721 and ERC-20
+contracts, then classifies every contract like the indexer does: once
+without cache, then twice through the call cache (cold and warm, as after a
+reindex).
+
+Usage: python benchmarks/classification.py [--contracts N] [--mongo-url URL]
+
+Without `--mongo-url` the cache is kept in memory.
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from nftmeow.fake_starknet import FakeStarkNetRpc
+from nftmeow.indexer.erc721 import ERC721Contract, FeltTokenId
+from nftmeow.starknet_rpc import CachedCallRpcClient, StarkNetRpcClient
+
+
+class _MemoryStorage(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+def _contracts(count: int):
+    contracts = dict()
+    for i in range(count):
+        address = hex(0x1000 + i)
+        if i % 2 == 0:
+            contracts[address] = {"supportsInterface": ["0x1"], "name": ["0x4d656f77"]}
+        else:
+            contracts[address] = {"name": ["0x4574686572"]}
+    return contracts
+
+
+async def _classify_all(rpc, addresses):
+    for address in addresses:
+        contract = ERC721Contract(rpc, address)
+        if await contract.is_erc721(FeltTokenId(1)):
+            await contract.name()
+
+
+async def _run(args):
+    contracts = _contracts(args.contracts)
+    fake = FakeStarkNetRpc(contracts)
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    rpc = StarkNetRpcClient(f"http://127.0.0.1:{port}")
+
+    if args.mongo_url:
+        from pymongo import MongoClient
+
+        from nftmeow.indexer.storage import CachedCallStorage
+
+        client = MongoClient(args.mongo_url)
+        client.drop_database(args.db_name)
+        storage = CachedCallStorage(client[args.db_name])
+    else:
+        storage = _MemoryStorage()
+
+    addresses = [int(a, 16).to_bytes(32, "big") for a in contracts]
+    cached_rpc = CachedCallRpcClient(rpc, storage)
+    for name, client_rpc in [
+        ("no cache", rpc),
+        ("cache (cold)", cached_rpc),
+        ("cache (warm)", cached_rpc),
+    ]:
+        requests = fake.requests
+        start = time.perf_counter()
+        await _classify_all(client_rpc, addresses)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:<14} {elapsed * 1_000:>9.1f} ms "
+            f"{fake.requests - requests:>6} rpc requests"
+        )
+
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contracts", type=int, default=500)
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--db-name", default="nftmeow_bench")
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark the import time of each `nftmeow` subcommand.
+
+Every subcommand imports the CLI module and then only the subsystem it needs.
+The subcommands are read from the CLI group, together with the imports in
+their body. This script runs each combination in a fresh interpreter with
+`-X importtime` and reports the total import time and the slowest top level
+imports.
+
+Usage: python benchmarks/import_time.py [--repeat N] [--top N]
+"""
+
+import argparse
+import ast
+import inspect
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+from nftmeow.main import cli
+
+
+def _lazy_imports(function) -> List[str]:
+    """Return the import statements in the body of `function`."""
+    source = inspect.getsource(function)
+    return [
+        ast.get_source_segment(source, node)
+        for node in ast.walk(ast.parse(source))
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+def _subcommands() -> Dict[str, List[str]]:
+    subcommands = {"cli": []}
+    for name, command in sorted(cli.commands.items()):
+        subcommands[name] = _lazy_imports(command.callback)
+    return subcommands
+
+
+def _import_times(imports):
+    """Return the cumulative import time (us) of each top level import."""
+    statements = ["import nftmeow.main"] + imports
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(statements)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:") :].split("|")
+        # Top level imports are not indented.
+        if name.startswith(" ") and not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    for subcommand, imports in _subcommands().items():
+        best_total = None
+        best_times = None
+        for _ in range(args.repeat):
+            times = _import_times(imports)
+            total = sum(times.values())
+            if best_total is None or total < best_total:
+                best_total, best_times = total, times
+
+        print(f"{subcommand:<16} {best_total / 1_000:>8.1f} ms")
+        by_package = defaultdict(int)
+        for name, cumulative in best_times.items():
+            by_package[name] += cumulative
+        slowest = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)
+        for name, cumulative in slowest[: args.top]:
+            print(f"    {name:<40} {cumulative / 1_000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
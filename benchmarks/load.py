@@ -0,0 +1,336 @@
+"""Load test the GraphQL API with a mix of the README queries.
+
+Seeds a scratch database with synthetic collections, tokens and transfers,
+starts `nftmeow api-server` on it, then sends the queries from concurrent
+clients with randomized variables for `--duration` seconds.
+
+Reports throughput and latency percentiles for each query, together with the
+MongoDB operations per request (from the `serverStatus` op counters, so the
+database should not be shared with other clients while the test runs).
+
+Usage: python benchmarks/load.py --mongo-url URL [--concurrency 16]
+    [--duration 30] [--mix collections=1,tokens_by_owner=3,...]
+
+Pass `--no-seed` to reuse the data of a previous run, or `--url` to test a
+server that is already running on the database.
+"""
+
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+import aiohttp
+from pymongo import MongoClient
+
+from nftmeow import activity, token_layout
+from nftmeow.indexer.batch import create_batch_indexes
+from nftmeow.indexer.rollback import create_rollback_indexes
+
+ZERO_ADDRESS = bytes(32)
+
+DEFAULT_MIX = (
+    "collections=1,tokens_by_owner=3,tokens_by_collection=3,recent_transfers=1,"
+    "recent_mints=2"
+)
+
+QUERIES = {
+    "collections": """
+        {
+          collections(first: %(first)d) {
+            edges { node { name address } }
+          }
+        }
+    """,
+    "tokens_by_owner": """
+        {
+          tokens(owner: { eq: "%(owner)s" }) {
+            edges { node { tokenId collection { name } owners } }
+          }
+        }
+    """,
+    "tokens_by_collection": """
+        {
+          tokens(collection: { eq: "%(collection)s" }) {
+            edges { node { tokenId collection { address name } owners } }
+          }
+        }
+    """,
+    "recent_transfers": """
+        {
+          transfers(first: %(first)d, fromAddress: { eq: "0x0" }) {
+            edges {
+              node {
+                fromAddress
+                toAddress
+                time
+                token { tokenId collection { name } }
+              }
+            }
+          }
+        }
+    """,
+    "recent_mints": """
+        {
+          mints(first: %(first)d) {
+            edges { node { toAddress time token { tokenId collection { name } } } }
+          }
+        }
+    """,
+}
+
+
+def _address(rng: random.Random) -> bytes:
+    return rng.getrandbits(251).to_bytes(32, "big")
+
+
+def _hex(address: bytes) -> str:
+    return "0x" + address.hex()
+
+
+class _Dataset:
+    """Synthetic data, generated from a seed so that runs are reproducible."""
+
+    def __init__(self, collections: int, owners: int, tokens: int, seed: int = 42):
+        rng = random.Random(seed)
+        self.collections = [_address(rng) for _ in range(collections)]
+        self.owners = [_address(rng) for _ in range(owners)]
+        self.tokens = tokens
+        self._seed = seed
+
+    def seed(self, db):
+        for name in ("contracts", "tokens", "transfers", "migrations"):
+            db[name].drop()
+        token_layout.create_indexes(db)
+        activity.create_indexes(db)
+        create_batch_indexes(db)
+        create_rollback_indexes(db)
+
+        db["contracts"].insert_many(
+            {"contract_address": address, "type": "erc721", "name": f"Meow {i}"}
+            for i, address in enumerate(self.collections)
+        )
+
+        rng = random.Random(self._seed)
+        ts = datetime.fromtimestamp(1_650_000_000)
+        tokens, transfers = [], []
+        for i in range(self.tokens):
+            contract = rng.choice(self.collections)
+            token_id = i.to_bytes(32, "big")
+            owner = rng.choice(self.owners)
+            block = 21_000 + i // 100
+            tokens.append(
+                token_layout.to_document(contract, token_id, owner, ts, block)
+            )
+            transfers.append(
+                {
+                    "contract_address": contract,
+                    "token_id": token_id,
+                    "from": ZERO_ADDRESS,
+                    "to": owner,
+                    "created_at": ts,
+                    "_chain": {"valid_from": block, "valid_to": None},
+                }
+            )
+            if len(tokens) == 10_000:
+                db["tokens"].insert_many(tokens)
+                db["transfers"].insert_many(transfers)
+                tokens, transfers = [], []
+        if tokens:
+            db["tokens"].insert_many(tokens)
+            db["transfers"].insert_many(transfers)
+
+        db["migrations"].insert_one(
+            {"_id": "tokens", "version": token_layout.LAYOUT_VERSION}
+        )
+        activity.rebuild(db)
+
+    def variables(self, rng: random.Random) -> dict:
+        return {
+            "first": rng.choice([10, 20, 50]),
+            "owner": _hex(rng.choice(self.owners)),
+            "collection": _hex(rng.choice(self.collections)),
+        }
+
+
+def _parse_mix(mix: str) -> Dict[str, int]:
+    weights = dict()
+    for item in mix.split(","):
+        name, weight = item.split("=")
+        if name not in QUERIES:
+            raise ValueError(f"unknown query {name}, expected one of {list(QUERIES)}")
+        weights[name] = int(weight)
+    return weights
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def _opcounters(db) -> Dict[str, int]:
+    return db.command("serverStatus")["opcounters"]
+
+
+async def _worker(session, url, dataset, weights, rng, deadline, latencies, errors):
+    names = list(weights)
+    query_weights = list(weights.values())
+    while time.monotonic() < deadline:
+        (name,) = rng.choices(names, weights=query_weights)
+        query = QUERIES[name] % dataset.variables(rng)
+        start = time.perf_counter()
+        try:
+            async with session.post(url, json={"query": query}) as response:
+                body = await response.json()
+            failed = response.status != 200 or bool(body.get("errors"))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            # Dropped connections and bodies that aren't JSON are errors too,
+            # they must not stop the other workers.
+            failed = True
+        elapsed = time.perf_counter() - start
+        if failed:
+            errors[name] += 1
+        latencies[name].append(elapsed)
+
+
+async def _load(url, dataset, weights, concurrency, duration, seed):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.monotonic() + duration
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(
+            *(
+                _worker(
+                    session,
+                    url,
+                    dataset,
+                    weights,
+                    random.Random(seed + i),
+                    deadline,
+                    latencies,
+                    errors,
+                )
+                for i in range(concurrency)
+            )
+        )
+    return latencies, errors
+
+
+async def _wait_for_server(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.post(url, json={"query": "{ __typename }"}):
+                    return
+            except aiohttp.ClientConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+
+def _report(latencies, errors, duration, ops_before, ops_after):
+    print(
+        f"{'query':<22} {'requests':>9} {'errors':>7} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p99 ms':>8}"
+    )
+    rows = list(latencies.items())
+    rows.append(("total", [v for values in latencies.values() for v in values]))
+    for name, values in rows:
+        if not values:
+            continue
+        errors_count = sum(errors.values()) if name == "total" else errors[name]
+        print(
+            f"{name:<22} {len(values):>9} {errors_count:>7} "
+            f"{len(values) / duration:>8.1f} "
+            f"{_percentile(values, 0.5) * 1_000:>8.2f} "
+            f"{_percentile(values, 0.99) * 1_000:>8.2f}"
+        )
+
+    requests = len(rows[-1][1])
+    if requests:
+        ops = {
+            op: (ops_after[op] - ops_before[op]) / requests
+            for op in ("query", "getmore", "command")
+        }
+        print(
+            "mongo ops/request: "
+            + " ".join(f"{op}={count:.2f}" for op, count in ops.items())
+        )
+
+
+async def _run(args):
+    weights = _parse_mix(args.mix)
+    dataset = _Dataset(args.collections, args.owners, args.tokens, seed=args.seed)
+    db = MongoClient(args.mongo_url)[args.db_name]
+
+    if args.seed_data:
+        start = time.perf_counter()
+        dataset.seed(db)
+        print(f"seeded {args.tokens} tokens in {time.perf_counter() - start:.1f} s")
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}/graphql"
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "from nftmeow.main import cli; cli()",
+                "api-server",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(args.port),
+                "--mongo-url",
+                args.mongo_url,
+                "--db-name",
+                args.db_name,
+            ]
+        )
+    try:
+        await _wait_for_server(url)
+        if args.warmup > 0:
+            await _load(url, dataset, weights, args.concurrency, args.warmup, args.seed)
+
+        ops_before = _opcounters(db)
+        latencies, errors = await _load(
+            url, dataset, weights, args.concurrency, args.duration, args.seed
+        )
+        ops_after = _opcounters(db)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    _report(latencies, errors, args.duration, ops_before, ops_after)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", required=True)
+    parser.add_argument("--db-name", default="nftmeow_load")
+    parser.add_argument("--url", default=None, help="Test an existing server.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--owners", type=int, default=5_000)
+    parser.add_argument("--tokens", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", dest="seed_data", action="store_false")
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
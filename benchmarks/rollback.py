@@ -0,0 +1,101 @@
+"""Benchmark chain-reorg rollback against databases of increasing size.
+
+Seeds a scratch database with token versions and transfers spread over
+`--blocks` blocks, then rolls back reorgs of increasing depth. Since rollback
+only touches indexed documents of the rolled back blocks, its time should grow
+with the reorg depth and stay flat as the database grows.
+
+Usage: python benchmarks/rollback.py --mongo-url URL [--sizes 100000,1000000]
+
+The database `--db-name` is dropped before each run.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from nftmeow import token_layout
+from nftmeow.indexer.batch import create_batch_indexes
+from nftmeow.indexer.rollback import create_rollback_indexes, rollback
+
+TOKENS_PER_BLOCK = 100
+REORG_DEPTHS = [1, 10, 100]
+
+
+def _address(n: int) -> bytes:
+    return n.to_bytes(32, "big")
+
+
+def _seed(db, transfers: int, blocks: int):
+    """Insert `transfers` transfers, each creating a token version."""
+    db["tokens"].drop()
+    db["transfers"].drop()
+    token_layout.create_indexes(db)
+    create_batch_indexes(db)
+    create_rollback_indexes(db)
+
+    ts = datetime.fromtimestamp(1_650_000_000)
+    per_block = max(transfers // blocks, 1)
+    tokens, transfer_docs = [], []
+    for i in range(transfers):
+        block = i // per_block
+        token_id = i % (TOKENS_PER_BLOCK * 10)
+        # The version created by the next transfer of the same token.
+        next_block = (i + TOKENS_PER_BLOCK * 10) // per_block
+        valid_to = next_block if i + TOKENS_PER_BLOCK * 10 < transfers else None
+        tokens.append(
+            token_layout.to_document(
+                _address(1), _address(token_id), _address(i), ts, block, valid_to
+            )
+        )
+        transfer_docs.append(
+            {
+                "contract_address": _address(1),
+                "token_id": _address(token_id),
+                "from": _address(0),
+                "to": _address(i),
+                "created_at": ts,
+                "_chain": {"valid_from": block, "valid_to": None},
+            }
+        )
+        if len(tokens) == 10_000:
+            db["tokens"].insert_many(tokens)
+            db["transfers"].insert_many(transfer_docs)
+            tokens, transfer_docs = [], []
+    if tokens:
+        db["tokens"].insert_many(tokens)
+        db["transfers"].insert_many(transfer_docs)
+    return block
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-url", required=True)
+    parser.add_argument("--db-name", default="nftmeow_bench")
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--blocks", type=int, default=10_000)
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_url)
+    client.drop_database(args.db_name)
+    db = client[args.db_name]
+
+    print(f"{'transfers':>10} {'depth':>6} {'changed':>8} {'time':>10}")
+    for size in map(int, args.sizes.split(",")):
+        for depth in REORG_DEPTHS:
+            last_block = _seed(db, size, args.blocks)
+            start = time.perf_counter()
+            counts = rollback(db, last_block - depth + 1, legacy=False)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{size:>10} {depth:>6} {sum(counts.values()):>8} "
+                f"{elapsed * 1_000:>7.1f} ms"
+            )
+
+    client.drop_database(args.db_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark serialization of a large `tokens` page.
+
+Builds a page shaped like the response to
+
+    tokens(first: 200) { edges { node { tokenId owners collection { address name } } } }
+
+and measures the CPU time spent serializing scalars, encoding json and
+compressing the response, together with the number of bytes sent.
+
+Usage: python benchmarks/serialization.py [--iterations N]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+from nftmeow.web import response
+from nftmeow.web.scalar import _serialize_address, _serialize_token_id
+
+PAGE_SIZE = 200
+
+
+def _baseline_serialize_address(addr: bytes) -> str:
+    return "0x" + addr.zfill(32).hex()
+
+
+def _baseline_serialize_token_id(token_id: bytes) -> str:
+    return "0x" + token_id.hex()
+
+
+def _baseline_encode(data) -> bytes:
+    return json.dumps(data).encode("utf-8")
+
+
+def _random_address(rng: random.Random) -> bytes:
+    return rng.getrandbits(251).to_bytes(32, "big")
+
+
+def _make_rows(rng: random.Random):
+    # A few collections and owners are repeated many times in a page.
+    collections = [(_random_address(rng), f"Collection {i}") for i in range(5)]
+    owners = [_random_address(rng) for _ in range(40)]
+    return [
+        (
+            rng.getrandbits(64).to_bytes(32, "big"),
+            [rng.choice(owners)],
+            rng.choice(collections),
+        )
+        for _ in range(PAGE_SIZE)
+    ]
+
+
+def _build_page(rows, serialize_address, serialize_token_id):
+    edges = [
+        {
+            "node": {
+                "tokenId": serialize_token_id(token_id),
+                "owners": [serialize_address(o) for o in owners],
+                "collection": {
+                    "address": serialize_address(collection[0]),
+                    "name": collection[1],
+                },
+            },
+            "cursor": "62c45a6b8a1e2b0f3c9d1e2f",
+        }
+        for token_id, owners, collection in rows
+    ]
+    return {"data": {"tokens": {"edges": edges}}}
+
+
+def _run(
+    name, iterations, rows, serialize_address, serialize_token_id, encode, compress
+):
+    sent = 0
+    start = time.process_time()
+    for _ in range(iterations):
+        page = _build_page(rows, serialize_address, serialize_token_id)
+        body = compress(encode(page))
+        sent = len(body)
+    elapsed = time.process_time() - start
+    per_response = elapsed / iterations * 1_000
+    print(f"{name:<28} {sent:>9} bytes {per_response:>9.3f} ms cpu/response")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    rows = _make_rows(random.Random(42))
+
+    def identity(body):
+        return body
+
+    def gzip_compress(body):
+        return gzip.compress(body, compresslevel=6)
+
+    _run(
+        "baseline",
+        args.iterations,
+        rows,
+        _baseline_serialize_address,
+        _baseline_serialize_token_id,
+        _baseline_encode,
+        identity,
+    )
+    _run(
+        "memo + fast json",
+        args.iterations,
+        rows,
+        _serialize_address,
+        _serialize_token_id,
+        response.encode_json,
+        identity,
+    )
+    _run(
+        "memo + fast json + gzip",
+        args.iterations,
+        rows,
+        _serialize_address,
+        _serialize_token_id,
+        response.encode_json,
+        gzip_compress,
+    )
+    if response.brotli is not None:
+
+        def brotli_compress(body):
+            return response.brotli.compress(body, quality=response.BROTLI_QUALITY)
+
+        _run(
+            "memo + fast json + br",
+            args.iterations,
+            rows,
+            _serialize_address,
+            _serialize_token_id,
+            response.encode_json,
+            brotli_compress,
+        )
+
+
+if __name__ == "__main__":
+    main()
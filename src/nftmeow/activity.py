@@ -0,0 +1,394 @@
+"""Mints and activity buckets, maintained by the indexer next to transfers.
+
+Mints are copied from transfers to the `mints` collection:
+
+    {
+        "contract_address": bytes,
+        "token_id": bytes,
+        "to": bytes,
+        "created_at": datetime,
+        "event_key": int,
+        "_chain": {"valid_from": int, "valid_to": None},
+    }
+
+Activity is counted per collection in hourly and daily buckets, in the
+`activity` collection:
+
+    {
+        "contract_address": bytes,
+        "period": "hour" | "day",
+        "start": datetime,
+        "mints": int,
+        "transfers": int,
+        "unique_receivers": int,
+        "last_block": int,  # last block counted in the bucket
+    }
+
+The receivers of each bucket are kept apart, in the `activity_receivers`
+collection, so that bucket documents don't grow with them:
+
+    {
+        "contract_address": bytes,
+        "period": "hour" | "day",
+        "start": datetime,
+        "receiver": bytes,
+        "first_block": int,  # first block with a transfer to the receiver
+    }
+
+`last_block` makes counting a block twice a no-op, and `first_block` tells
+which receivers a block added. Since buckets can't be decremented,
+`recompute_buckets` counts them again from `transfers` after a rollback, and
+`rebuild` recreates mints and buckets from scratch.
+"""
+
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Dict, Iterable, Iterator, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne
+from pymongo.database import Database
+
+logger = getLogger(__name__)
+
+ZERO_ADDRESS = bytes(32)
+
+PERIODS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+BucketKey = Tuple[bytes, str, datetime]
+
+
+def bucket_start(created_at: datetime, period: str) -> datetime:
+    if period == "hour":
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    if period == "day":
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"unknown period {period}")
+
+
+def create_indexes(db: Database):
+    db["mints"].create_index(
+        [("event_key", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"event_key": {"$exists": True}},
+    )
+    db["mints"].create_index(
+        [("contract_address", ASCENDING), ("event_key", DESCENDING)]
+    )
+    db["mints"].create_index([("_chain.valid_from", ASCENDING)])
+    db["activity"].create_index(
+        [("contract_address", ASCENDING), ("period", ASCENDING), ("start", DESCENDING)],
+        unique=True,
+    )
+    db["activity"].create_index([("last_block", ASCENDING)])
+    db["activity_receivers"].create_index(
+        [
+            ("contract_address", ASCENDING),
+            ("period", ASCENDING),
+            ("start", ASCENDING),
+            ("receiver", ASCENDING),
+        ],
+        unique=True,
+    )
+    # Used to count the receivers added by a block.
+    db["activity_receivers"].create_index(
+        [
+            ("contract_address", ASCENDING),
+            ("period", ASCENDING),
+            ("start", ASCENDING),
+            ("first_block", ASCENDING),
+        ]
+    )
+    db["activity_receivers"].create_index([("first_block", ASCENDING)])
+    # Used to count buckets again from transfers.
+    db["transfers"].create_index(
+        [("contract_address", ASCENDING), ("created_at", ASCENDING)]
+    )
+    # Used by `rebuild` to read transfers in block order without sorting them
+    # in memory.
+    db["transfers"].create_index([("_chain.valid_from", ASCENDING), ("_id", ASCENDING)])
+
+
+class BucketCounts:
+    """Activity of a bucket, counted in memory.
+
+    `receivers` maps each receiver to the first block it was counted in.
+    """
+
+    def __init__(self):
+        self.mints = 0
+        self.transfers = 0
+        self.receivers: Dict[bytes, int] = dict()
+        self.last_block = -1
+
+    def add(self, from_address: bytes, to_address: bytes, block_number: int):
+        self.last_block = max(self.last_block, block_number)
+        self.transfers += 1
+        if from_address == ZERO_ADDRESS:
+            self.mints += 1
+        self.receivers.setdefault(to_address, block_number)
+
+
+def count_transfer(
+    buckets: Dict[BucketKey, BucketCounts],
+    contract: bytes,
+    from_address: bytes,
+    to_address: bytes,
+    created_at: datetime,
+    block_number: int,
+):
+    """Add a transfer to the buckets it belongs to."""
+    for period in PERIODS:
+        key = (contract, period, bucket_start(created_at, period))
+        counts = buckets.get(key)
+        if counts is None:
+            counts = buckets[key] = BucketCounts()
+        counts.add(from_address, to_address, block_number)
+
+
+def _bucket_filter(key: BucketKey) -> dict:
+    contract, period, start = key
+    return {"contract_address": contract, "period": period, "start": start}
+
+
+def receiver_updates(
+    buckets: Dict[BucketKey, BucketCounts]
+) -> Iterator[Tuple[BucketKey, UpdateOne]]:
+    """Bulk write requests storing the receivers of the buckets.
+
+    Yields each request together with the bucket it belongs to.
+    """
+    for key, counts in buckets.items():
+        for receiver, first_block in counts.receivers.items():
+            yield key, UpdateOne(
+                {**_bucket_filter(key), "receiver": receiver},
+                {"$min": {"first_block": first_block}},
+                upsert=True,
+            )
+
+
+def count_new_receivers(
+    db: Database,
+    block_number: int,
+    buckets: Dict[BucketKey, BucketCounts],
+    session=None,
+) -> Dict[BucketKey, int]:
+    """Count the receivers first seen in `block_number`, once stored."""
+    return {
+        key: db["activity_receivers"].count_documents(
+            {**_bucket_filter(key), "first_block": block_number}, session=session
+        )
+        for key in buckets
+    }
+
+
+def bucket_updates(
+    block_number: int,
+    buckets: Dict[BucketKey, BucketCounts],
+    new_receivers: Dict[BucketKey, int],
+):
+    """Bulk write requests adding the activity of a block to the buckets.
+
+    They must be executed in order.
+    """
+    for key, counts in buckets.items():
+        filter = _bucket_filter(key)
+        yield UpdateOne(filter, {"$setOnInsert": {"last_block": -1}}, upsert=True)
+        yield UpdateOne(
+            {**filter, "last_block": {"$lt": block_number}},
+            {
+                "$inc": {
+                    "mints": counts.mints,
+                    "transfers": counts.transfers,
+                    "unique_receivers": new_receivers.get(key, 0),
+                },
+                "$set": {"last_block": block_number},
+            },
+        )
+
+
+def recompute_buckets(db: Database, keys: Iterable[BucketKey]) -> int:
+    """Count the given buckets again from `transfers`.
+
+    The receivers first seen in the rolled back blocks must be deleted
+    before, the others are still valid.
+
+    Returns the number of buckets recomputed.
+    """
+    recomputed = 0
+    for key in set(keys):
+        contract, period, start = key
+        transfers = db["transfers"].find(
+            {
+                "contract_address": contract,
+                "created_at": {"$gte": start, "$lt": start + PERIODS[period]},
+            },
+            {"from": 1, "_chain.valid_from": 1},
+        )
+        mints, transfers_count, last_block = 0, 0, -1
+        for transfer in transfers:
+            transfers_count += 1
+            if transfer["from"] == ZERO_ADDRESS:
+                mints += 1
+            last_block = max(last_block, transfer["_chain"]["valid_from"])
+        filter = _bucket_filter(key)
+        if transfers_count == 0:
+            db["activity"].delete_one(filter)
+        else:
+            document = {
+                **filter,
+                "mints": mints,
+                "transfers": transfers_count,
+                "unique_receivers": db["activity_receivers"].count_documents(filter),
+                "last_block": last_block,
+            }
+            db["activity"].replace_one(filter, document, upsert=True)
+        recomputed += 1
+    return recomputed
+
+
+def _flush_buckets(db: Database, buckets: Dict[BucketKey, BucketCounts]):
+    """Add partial counts to the buckets, while rebuilding them."""
+    db["activity_receivers"].bulk_write(
+        [request for _, request in receiver_updates(buckets)], ordered=False
+    )
+    db["activity"].bulk_write(
+        [
+            UpdateOne(
+                _bucket_filter(key),
+                {
+                    "$inc": {"mints": counts.mints, "transfers": counts.transfers},
+                    "$max": {"last_block": counts.last_block},
+                },
+                upsert=True,
+            )
+            for key, counts in buckets.items()
+        ],
+        ordered=False,
+    )
+
+
+def _count_receivers(db: Database, batch_size: int):
+    """Store the number of receivers of every bucket, while rebuilding them."""
+    counts = db["activity_receivers"].aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {
+                        "contract_address": "$contract_address",
+                        "period": "$period",
+                        "start": "$start",
+                    },
+                    "count": {"$sum": 1},
+                }
+            }
+        ],
+        allowDiskUse=True,
+    )
+    requests = []
+    for bucket in counts:
+        requests.append(
+            UpdateOne(bucket["_id"], {"$set": {"unique_receivers": bucket["count"]}})
+        )
+        if len(requests) == batch_size:
+            db["activity"].bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        db["activity"].bulk_write(requests, ordered=False)
+
+
+def rebuild(db: Database, batch_size: int = 1_000) -> Tuple[int, int]:
+    """Recreate mints and activity buckets from `transfers`.
+
+    Transfers indexed before mints were tracked have no event key, they are
+    given one from their block and their order in it. Mints and buckets are
+    written every `batch_size` transfers, buckets counted in different
+    batches are merged. Run it while the indexer is stopped, after
+    `create_indexes`.
+
+    Returns the number of mints and buckets written.
+    """
+    db["mints"].delete_many({})
+    db["activity"].delete_many({})
+    db["activity_receivers"].delete_many({})
+    buckets: Dict[BucketKey, BucketCounts] = dict()
+    counted = 0
+    mints = []
+    written = 0
+    block_number, block_index = None, 0
+
+    transfers = (
+        db["transfers"]
+        .find()
+        .sort([("_chain.valid_from", ASCENDING), ("_id", ASCENDING)])
+    )
+    for transfer in transfers.batch_size(batch_size):
+        valid_from = transfer["_chain"]["valid_from"]
+        if valid_from != block_number:
+            block_number, block_index = valid_from, 0
+        event_key = transfer.get("event_key", (valid_from << 32) | block_index)
+        block_index += 1
+
+        count_transfer(
+            buckets,
+            transfer["contract_address"],
+            transfer["from"],
+            transfer["to"],
+            transfer["created_at"],
+            valid_from,
+        )
+        counted += 1
+        if counted == batch_size:
+            _flush_buckets(db, buckets)
+            buckets, counted = dict(), 0
+
+        if transfer["from"] == ZERO_ADDRESS:
+            mints.append(
+                ReplaceOne(
+                    {"event_key": event_key},
+                    mint_document(
+                        transfer["contract_address"],
+                        transfer["token_id"],
+                        transfer["to"],
+                        transfer["created_at"],
+                        valid_from,
+                        event_key,
+                    ),
+                    upsert=True,
+                )
+            )
+            if len(mints) == batch_size:
+                db["mints"].bulk_write(mints, ordered=False)
+                written += len(mints)
+                mints = []
+    if mints:
+        db["mints"].bulk_write(mints, ordered=False)
+        written += len(mints)
+    if buckets:
+        _flush_buckets(db, buckets)
+    _count_receivers(db, batch_size)
+    logger.info(f"Rebuilt {written} mints")
+
+    documents = db["activity"].count_documents({})
+    logger.info(f"Rebuilt {documents} activity buckets")
+    return written, documents
+
+
+def mint_document(
+    contract: bytes,
+    token_id: bytes,
+    to_address: bytes,
+    created_at: datetime,
+    block_number: int,
+    event_key: int,
+) -> dict:
+    return {
+        "contract_address": contract,
+        "token_id": token_id,
+        "to": to_address,
+        "created_at": created_at,
+        "event_key": event_key,
+        "_chain": {"valid_from": block_number, "valid_to": None},
+    }
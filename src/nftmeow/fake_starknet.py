@@ -0,0 +1,93 @@
+"""A local stand-in for a StarkNet JSON-RPC node.
+
+Serves `starknet_call` and `starknet_getBlockByHash` from scripted data, so
+that contract classification can be tested and benchmarked without network.
+
+Contracts are scripted as a mapping from address to the result of each of
+their methods:
+
+    {
+        "0x0123...": {
+            "supportsInterface": ["0x1"],
+            "name": ["0x4d656f77"],
+        },
+        "0x0456...": {
+            "tokenURI": {"error": "Invalid message selector"},
+            "name": {"error": "Internal error", "code": -32603},
+        },
+    }
+
+Methods that are not scripted return an error, like the node does for missing
+entry points. Scripted errors have the same code unless `code` is given.
+Calldata is ignored.
+"""
+
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from nftmeow.starknet_rpc import (CONTRACT_NOT_FOUND, INVALID_MESSAGE_SELECTOR,
+                                  selector_from_name)
+
+
+def _normalize_address(address: str) -> int:
+    return int(address, 16)
+
+
+class FakeStarkNetRpc:
+    def __init__(self, contracts: Dict[str, dict], block_time: Optional[int] = None):
+        self._contracts = dict()
+        for address, methods in contracts.items():
+            self._contracts[_normalize_address(address)] = {
+                selector_from_name(method): result for method, result in methods.items()
+            }
+        if block_time is None:
+            block_time = int(datetime.now().timestamp())
+        self._block_time = block_time
+        self.requests = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "FakeStarkNetRpc":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        return app
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        data = await request.json()
+        method = data["method"]
+        params = data["params"]
+        if method == "starknet_call":
+            response = self._call(params[0])
+        elif method == "starknet_getBlockByHash":
+            response = {
+                "result": {"block_hash": params[0], "accepted_time": self._block_time}
+            }
+        else:
+            response = {"error": {"code": -32601, "message": "Method not found"}}
+        return web.json_response({"id": data["id"], "jsonrpc": "2.0", **response})
+
+    def _call(self, request: dict) -> dict:
+        contract = self._contracts.get(_normalize_address(request["contract_address"]))
+        if contract is None:
+            return {
+                "error": {"code": CONTRACT_NOT_FOUND, "message": "Contract not found"}
+            }
+        result = contract.get(request["entry_point_selector"])
+        if result is None:
+            return {
+                "error": {
+                    "code": INVALID_MESSAGE_SELECTOR,
+                    "message": "Invalid message selector",
+                }
+            }
+        if isinstance(result, dict) and "error" in result:
+            code = result.get("code", INVALID_MESSAGE_SELECTOR)
+            return {"error": {"code": code, "message": result["error"]}}
+        return {"result": result}
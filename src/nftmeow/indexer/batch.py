@@ -0,0 +1,238 @@
+"""Write the changes of a block atomically."""
+
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from pymongo.database import Database
+
+from nftmeow import activity, token_layout
+
+# Field with the key of the event that created a transfer
+TRANSFER_EVENT_KEY = "event_key"
+# Field with the key of the event that created a token version
+TOKEN_EVENT_KEY = "k"
+
+_TRANSACTION_TOPOLOGIES = ("ReplicaSetWithPrimary", "Sharded", "LoadBalanced")
+
+
+def event_key(block_number: int, event_index: int) -> int:
+    """Deterministic key of an event, used to make writes idempotent."""
+    return (block_number << 32) | event_index
+
+
+def create_batch_indexes(db: Database):
+    db["tokens"].create_index(
+        [(TOKEN_EVENT_KEY, ASCENDING)],
+        unique=True,
+        partialFilterExpression={TOKEN_EVENT_KEY: {"$exists": True}},
+    )
+    db["transfers"].create_index(
+        [(TRANSFER_EVENT_KEY, ASCENDING)],
+        unique=True,
+        partialFilterExpression={TRANSFER_EVENT_KEY: {"$exists": True}},
+    )
+    db["token_metadata"].create_index(
+        [("contract_address", ASCENDING), ("token_id", ASCENDING)]
+    )
+
+
+def supports_transactions(db: Database) -> bool:
+    topology = db.client.topology_description.topology_type_name
+    return topology in _TRANSACTION_TOPOLOGIES
+
+
+class BlockBatch:
+    """Collect the writes of a block and commit them together.
+
+    Documents are keyed by the event that created them and token versions
+    are read as they were before the block, so committing the same block
+    more than once (for example after a crash) gives the same result.
+
+    If the database supports it, the block is committed in a transaction.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        block_number: int,
+        legacy_tokens: bool = True,
+        use_transaction: bool = False,
+    ):
+        self._db = db
+        self.block_number = block_number
+        self._legacy_tokens = legacy_tokens
+        self._use_transaction = use_transaction
+        # Latest version of the tokens changed in this block
+        self._latest_tokens = dict()
+        self._new_tokens: List[dict] = []
+        self._tokens: List = []
+        self._transfers: List = []
+        self._token_metadata: List = []
+        self._mints: List = []
+        self._activity = dict()
+
+    def previous_token(self, contract: bytes, token_id: bytes) -> Optional[dict]:
+        """Return the latest version of the token, including this block."""
+        token = self._latest_tokens.get((contract, token_id))
+        if token is not None:
+            return token
+        if self.block_number == 0:
+            return None
+        return self._db["tokens"].find_one(
+            token_layout.token_filter(
+                contract=contract,
+                token_id=token_id,
+                at_block=self.block_number - 1,
+                legacy=self._legacy_tokens,
+            )
+        )
+
+    def transfer_token(
+        self,
+        contract: bytes,
+        token_id: bytes,
+        owner: bytes,
+        updated_at: datetime,
+        event_index: int,
+    ) -> Optional[dict]:
+        """Store a new version of the token, invalidating the previous one.
+
+        Returns the previous version of the token, or None if it's new.
+        """
+        previous = self.previous_token(contract, token_id)
+        if previous is None:
+            # insert metadata that will be fetched by the metadata
+            # fetchers
+            self._token_metadata.append(
+                UpdateOne(
+                    {"contract_address": contract, "token_id": token_id},
+                    {
+                        "$setOnInsert": {
+                            "status": "missing",
+                            "_chain": {"valid_to": None},
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+        elif (contract, token_id) in self._latest_tokens:
+            previous[token_layout.VALID_TO] = self.block_number
+        else:
+            self._invalidate(previous)
+
+        token = token_layout.to_document(
+            contract, token_id, owner, updated_at, valid_from=self.block_number
+        )
+        token[TOKEN_EVENT_KEY] = event_key(self.block_number, event_index)
+        self._latest_tokens[contract, token_id] = token
+        self._new_tokens.append(token)
+        return previous
+
+    def add_transfer(
+        self,
+        contract: bytes,
+        token_id: bytes,
+        from_address: bytes,
+        to_address: bytes,
+        created_at: datetime,
+        event_index: int,
+    ):
+        key = event_key(self.block_number, event_index)
+        self._transfers.append(
+            ReplaceOne(
+                {TRANSFER_EVENT_KEY: key},
+                {
+                    "contract_address": contract,
+                    "token_id": token_id,
+                    "from": from_address,
+                    "to": to_address,
+                    "created_at": created_at,
+                    "_chain": {"valid_from": self.block_number, "valid_to": None},
+                    TRANSFER_EVENT_KEY: key,
+                },
+                upsert=True,
+            )
+        )
+        if from_address == activity.ZERO_ADDRESS:
+            self._mints.append(
+                ReplaceOne(
+                    {TRANSFER_EVENT_KEY: key},
+                    activity.mint_document(
+                        contract,
+                        token_id,
+                        to_address,
+                        created_at,
+                        self.block_number,
+                        key,
+                    ),
+                    upsert=True,
+                )
+            )
+        activity.count_transfer(
+            self._activity,
+            contract,
+            from_address,
+            to_address,
+            created_at,
+            self.block_number,
+        )
+
+    def commit(self):
+        if self._use_transaction:
+            with self._db.client.start_session() as session:
+                session.with_transaction(self._write)
+        else:
+            self._write()
+
+    def _invalidate(self, token: dict):
+        # The token could be migrated to the new layout in the meantime,
+        # only one of the two updates will match.
+        self._tokens.append(
+            UpdateOne(
+                {"_id": token["_id"], token_layout.CONTRACT: {"$exists": True}},
+                {"$set": {token_layout.VALID_TO: self.block_number}},
+            )
+        )
+        if self._legacy_tokens:
+            self._tokens.append(
+                UpdateOne(
+                    {"_id": token["_id"], "contract_address": {"$exists": True}},
+                    {"$set": {"_chain.valid_to": self.block_number}},
+                )
+            )
+
+    def _write(self, session=None):
+        tokens = self._tokens + [
+            ReplaceOne({TOKEN_EVENT_KEY: token[TOKEN_EVENT_KEY]}, token, upsert=True)
+            for token in self._new_tokens
+        ]
+        for collection, requests in [
+            ("token_metadata", self._token_metadata),
+            ("tokens", tokens),
+            ("transfers", self._transfers),
+            ("mints", self._mints),
+        ]:
+            if requests:
+                self._db[collection].bulk_write(
+                    requests, ordered=False, session=session
+                )
+        if self._activity:
+            self._db["activity_receivers"].bulk_write(
+                [request for _, request in activity.receiver_updates(self._activity)],
+                ordered=False,
+                session=session,
+            )
+            new_receivers = activity.count_new_receivers(
+                self._db, self.block_number, self._activity, session=session
+            )
+            # Bucket updates depend on each other, keep them in order.
+            self._db["activity"].bulk_write(
+                list(
+                    activity.bucket_updates(
+                        self.block_number, self._activity, new_receivers
+                    )
+                ),
+                ordered=True,
+                session=session,
+            )
@@ -1,17 +1,23 @@
 import logging
 from datetime import datetime
-from typing import Iterator, List, Tuple
+from typing import Iterator, List, Optional, Tuple
 
-import pymongo
 from apibara.model import Event, EventFilter
 from pymongo import MongoClient
 
-from apibara import IndexerRunner, Info, NewBlock, NewEvents
+from apibara import IndexerRunner, Info, NewBlock, NewEvents, Reorg
+from nftmeow import activity, token_layout
+from nftmeow.indexer.batch import (BlockBatch, create_batch_indexes,
+                                   supports_transactions)
 from nftmeow.indexer.erc721 import (ERC721Contract, TransferEvent,
-                                    bytes_to_int, decode_transfer_event,
-                                    hex_to_bytes, int_to_bytes)
-from nftmeow.indexer.storage import CachedContractStorage
-from nftmeow.starknet_rpc import StarkNetRpcClient
+                                    decode_transfer_event, hex_to_bytes,
+                                    int_to_bytes)
+from nftmeow.indexer.recording import (EventRecorder, ReplayError,
+                                       ReplayRpcClient, read_blocks,
+                                       read_contracts)
+from nftmeow.indexer.rollback import create_rollback_indexes, rollback
+from nftmeow.indexer.storage import CachedCallStorage, CachedContractStorage
+from nftmeow.starknet_rpc import CachedCallRpcClient
 
 logger = logging.getLogger(__name__)
 
@@ -21,31 +27,56 @@ BRIQ_ADDRESS = hex_to_bytes(
 
 
 class NftIndexer:
-    def __init__(self, server_url, mongo_url, indexer_id):
+    def __init__(self, server_url, mongo_url, indexer_id, record_dir=None):
         self._server_url = server_url
         self._mongo_url = mongo_url
         self._indexer_id = indexer_id
         self._db_name = indexer_id.replace("-", "_")
         self._db = None
         self._contract_storage = None
+        self._call_storage = None
+        self._legacy_tokens = True
+        self._use_transactions = False
+        self._record_dir = record_dir
+        self._recorder = None
 
     def _mongo_client_db(self):
         mongo = MongoClient(self._mongo_url)
         db = mongo[self._db_name]
         return mongo, db
 
-    async def run(self):
+    def _setup_storage(self):
         _mongo, db = self._mongo_client_db()
         self._db = db
         self._contract_storage = CachedContractStorage(db)
+        self._call_storage = CachedCallStorage(db)
+        self._legacy_tokens = not token_layout.is_migrated(db)
+        token_layout.create_indexes(db)
+        create_batch_indexes(db)
+        create_rollback_indexes(db)
+        activity.create_indexes(db)
+        self._use_transactions = supports_transactions(db)
 
         db_status = db.command("serverStatus")
         logger.info(f'MongoDB connected: {db_status["host"]}')
 
+    async def run(self):
+        self._setup_storage()
+
+        if self._record_dir is not None:
+            contracts = (
+                (contract["contract_address"], contract)
+                for contract in self._db["contracts"].find()
+            )
+            self._recorder = EventRecorder(self._record_dir, contracts=contracts)
+            logger.info(f"Recording events to {self._record_dir}")
+
         runner = IndexerRunner(
             indexer_id=self._indexer_id, new_events_handler=self.handle_events
         )
 
+        runner.add_reorg_handler(self.handle_reorg)
+
         runner.create_if_not_exists(
             filters=[EventFilter.from_event_name(name="Transfer", address=None)],
             index_from_block=21_000,
@@ -53,19 +84,80 @@ class NftIndexer:
 
         await runner.run()
 
+    async def replay(
+        self,
+        record_dir: str,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+    ):
+        """Feed the events recorded in `record_dir` through `handle_events`.
+
+        Block timestamps and contracts classification are read from the
+        recording, so no call to the StarkNet node is made. Raises
+        `ReplayError` if a contract was not recorded, since its transfers
+        can't be indexed.
+        """
+        self._setup_storage()
+
+        contracts = 0
+        for address, contract in read_contracts(record_dir):
+            self._contract_storage.set_if_missing(address, contract)
+            contracts += 1
+        logger.info(f"Loaded {contracts} recorded contracts")
+
+        rpc_client = ReplayRpcClient()
+        info = Info(context=None, rpc_client=rpc_client)
+        blocks = 0
+        for message, accepted_time in read_blocks(record_dir, from_block, to_block):
+            rpc_client.accepted_time = accepted_time
+            await self.handle_events(info, message)
+            blocks += 1
+            if blocks % 1_000 == 0:
+                logger.info(f"Replayed up to block {message.block_number}")
+        logger.info(f"Replayed {blocks} blocks")
+
+    def rollback(self, block_number: int):
+        """Remove the data indexed from `block_number` onward."""
+        if self._db is None:
+            self._setup_storage()
+
+        counts = rollback(self._db, block_number, legacy=self._legacy_tokens)
+        self._contract_storage.invalidate()
+        # Cached calls are kept: they don't depend on the chain, and they are
+        # stored in `starknet_calls` anyway.
+        if self._recorder is not None:
+            self._recorder.rollback(block_number)
+        logger.info(f"Rolled back to block {block_number}: {counts}")
+
+    async def handle_reorg(self, _info: Info, message: Reorg):
+        logger.warning(f"Chain reorganization, new head {message.new_head.number}")
+        self.rollback(message.new_head.number + 1)
+
     async def handle_events(self, info: Info, message: NewEvents):
         block = await info.rpc_client.get_block_by_hash(message.block_hash)
-        block_timestamp = datetime.fromtimestamp(block["accepted_time"])
+        accepted_time = block["accepted_time"]
+        block_timestamp = datetime.fromtimestamp(accepted_time)
         logger.debug(f"got block {message.block_number} accepted at {block_timestamp}")
 
+        # Writes are collected and committed together, so that a block is
+        # either fully stored or can be handled again after a restart.
+        batch = BlockBatch(
+            self._db,
+            message.block_number,
+            legacy_tokens=self._legacy_tokens,
+            use_transaction=self._use_transactions,
+        )
         for event in message.events:
-            await self._handle_transfer_event(
-                info, message.block_number, block_timestamp, event
-            )
+            await self._handle_transfer_event(info, batch, block_timestamp, event)
+        batch.commit()
+
+        if self._recorder is not None:
+            self._recorder.record_block(message, accepted_time)
 
     async def _handle_transfer_event(
-        self, info: Info, block_number: int, block_timestamp: datetime, event: Event
+        self, info: Info, batch: BlockBatch, block_timestamp: datetime, event: Event
     ):
+        block_number = batch.block_number
         logger.info(f"Process event {block_number} {event}")
         # Decode event data. Notice that some contracts use a felt
         # for the token id and we need to support that too.
@@ -85,77 +177,39 @@ class NftIndexer:
         # The contract could be an ERC-20. Check it is an ERC-721.
         contract = self._contract_storage.get(event.address)
         if contract is None:
-            erc721 = ERC721Contract(info.rpc_client, event.address)
+            if isinstance(info.rpc_client, ReplayRpcClient):
+                # Classifying it would fail and store it as "other".
+                raise ReplayError(f"contract 0x{event.address.hex()} was not recorded")
+            rpc = CachedCallRpcClient(info.rpc_client, self._call_storage)
+            erc721 = ERC721Contract(rpc, event.address)
             if await erc721.is_erc721(transfer.token_id):
                 # get name and symbol
                 name = await erc721.name()
                 contract = {"type": "erc721", "name": name}
-                self._contract_storage.set(event.address, contract)
             else:
                 contract = {"type": "other"}
-                self._contract_storage.set(event.address, contract)
+            self._contract_storage.set(event.address, contract)
+            if self._recorder is not None:
+                self._recorder.record_contract(event.address, contract)
 
         if contract["type"] != "erc721":
             return
 
         # Now we know we have an ERC-721.
-        # Invalidate old token information
-        token = self._db["tokens"].find_one_and_update(
-            {
-                "contract_address": event.address,
-                "token_id": transfer.token_id.to_bytes(),
-                "_chain.valid_to": None,
-            },
-            {"$set": {"_chain.valid_to": block_number}},
-            return_document=pymongo.ReturnDocument.BEFORE,
-        )
-
-        if token is None:
-            # insert metadata that will be fetched by the metadata
-            # fetchers
-            self._db["token_metadata"].insert_one(
-                {
-                    "contract_address": event.address,
-                    "token_id": transfer.token_id.to_bytes(),
-                    "status": "missing",
-                    "_chain.valid_to": None,
-                }
-            )
-
-            before_owners = []
-        else:
-            before_owners = token["owners"]
-
-        from_as_bytes = int_to_bytes(transfer.from_address)
-        to_as_bytes = int_to_bytes(transfer.to_address)
-
-        after_owners = [
-            addr
-            for addr in before_owners
-            if bytes_to_int(addr) != transfer.from_address
-            and bytes_to_int(addr) != transfer.to_address
-        ] + [to_as_bytes]
-
-        # Store updated token information
-        self._db["tokens"].insert_one(
-            {
-                "contract_address": event.address,
-                "token_id": transfer.token_id.to_bytes(),
-                "updated_at": block_timestamp,
-                "owners": after_owners,
-                "_chain": {"valid_from": block_number, "valid_to": None},
-            }
+        batch.transfer_token(
+            event.address,
+            transfer.token_id.to_bytes(),
+            owner=int_to_bytes(transfer.to_address),
+            updated_at=block_timestamp,
+            event_index=event.block_index,
         )
-
-        self._db["transfers"].insert_one(
-            {
-                "contract_address": event.address,
-                "token_id": transfer.token_id.to_bytes(),
-                "from": from_as_bytes,
-                "to": to_as_bytes,
-                "created_at": block_timestamp,
-                "_chain": {"valid_from": block_number, "valid_to": None},
-            }
+        batch.add_transfer(
+            event.address,
+            transfer.token_id.to_bytes(),
+            from_address=int_to_bytes(transfer.from_address),
+            to_address=int_to_bytes(transfer.to_address),
+            created_at=block_timestamp,
+            event_index=event.block_index,
         )
 
     async def _handle_briq(
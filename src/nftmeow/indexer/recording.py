@@ -0,0 +1,252 @@
+"""Record the Apibara event stream to disk, to replay it later.
+
+Blocks are appended to segments (`events-<first block>.log`), each covering
+`segment_blocks` blocks. Each record is a bson document with the block number,
+hash and accepted time together with its events, compressed with zlib and
+prefixed by its length.
+
+Contract classifications are recorded to `contracts.log`, so that replay
+doesn't need to call the StarkNet node. Contracts classified before recording
+started are added to it when the recorder is opened.
+
+If the recorder is killed while writing, the incomplete record is discarded
+the next time the file is opened. After a chain reorganization, the blocks
+that are no longer part of the chain are removed from the recording.
+"""
+
+import os
+import re
+import struct
+import zlib
+from logging import getLogger
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+import bson
+from apibara.model import Event
+
+from apibara import NewEvents
+
+logger = getLogger(__name__)
+
+DEFAULT_SEGMENT_BLOCKS = 10_000
+
+CONTRACTS_FILE = "contracts.log"
+
+_SEGMENT_RE = re.compile(r"^events-(\d+)\.log$")
+
+_LENGTH = struct.Struct(">I")
+
+
+def _segment_name(first_block: int) -> str:
+    return f"events-{first_block:012d}.log"
+
+
+def _iter_frames(f: BinaryIO) -> Iterator[Tuple[int, bytes]]:
+    """Iterate over the complete records in `f`, with their end offset."""
+    while True:
+        header = f.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            return
+        (length,) = _LENGTH.unpack(header)
+        data = f.read(length)
+        if len(data) < length:
+            return
+        try:
+            record = zlib.decompress(data)
+        except zlib.error:
+            return
+        yield f.tell(), record
+
+
+def _open_for_append(path: str) -> BinaryIO:
+    f = open(path, "a+b")
+    f.seek(0)
+    end = 0
+    for end, _ in _iter_frames(f):
+        pass
+    if end != f.seek(0, os.SEEK_END):
+        logger.warning(f"discarding incomplete record at the end of {path}")
+        f.truncate(end)
+    return f
+
+
+def _write_record(f: BinaryIO, record: dict):
+    data = zlib.compress(bson.encode(record))
+    f.write(_LENGTH.pack(len(data)) + data)
+    # Make the record readable even if the process is killed.
+    f.flush()
+
+
+class EventRecorder:
+    """Append blocks and contract classifications to a recording.
+
+    `contracts` are the classifications already stored, they are recorded
+    if they are not in the recording yet.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_blocks: int = DEFAULT_SEGMENT_BLOCKS,
+        contracts: Iterable[Tuple[bytes, dict]] = (),
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._segment_blocks = segment_blocks
+        self._segment_start = None
+        self._segment = None
+        self._contracts = _open_for_append(os.path.join(directory, CONTRACTS_FILE))
+
+        recorded = {address for address, _ in read_contracts(directory)}
+        seeded = 0
+        for address, contract in contracts:
+            if address not in recorded:
+                self.record_contract(address, contract)
+                recorded.add(address)
+                seeded += 1
+        if seeded:
+            logger.info(f"Recorded {seeded} contracts classified before")
+
+    def record_block(self, message: NewEvents, accepted_time: int):
+        segment_start = message.block_number - (
+            message.block_number % self._segment_blocks
+        )
+        if segment_start != self._segment_start:
+            self._open_segment(segment_start)
+
+        events = [
+            {
+                "name": event.name,
+                "address": event.address,
+                "block_index": event.block_index,
+                "topics": event.topics,
+                "data": event.data,
+            }
+            for event in message.events
+        ]
+        record = {
+            "block_number": message.block_number,
+            "block_hash": message.block_hash,
+            "accepted_time": accepted_time,
+            "events": events,
+        }
+        _write_record(self._segment, record)
+
+    def record_contract(self, address: bytes, contract: dict):
+        data = {
+            k: v for k, v in contract.items() if k not in ("_id", "contract_address")
+        }
+        _write_record(self._contracts, {"address": address, "contract": data})
+
+    def rollback(self, block_number: int):
+        """Remove the blocks recorded from `block_number` onward."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+            self._segment_start = None
+
+        for segment_start in _list_segments(self._directory):
+            path = os.path.join(self._directory, _segment_name(segment_start))
+            if segment_start >= block_number:
+                os.remove(path)
+            elif segment_start + self._segment_blocks > block_number:
+                _truncate_from_block(path, block_number)
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._contracts.close()
+
+    def _open_segment(self, segment_start: int):
+        if self._segment is not None:
+            self._segment.close()
+        path = os.path.join(self._directory, _segment_name(segment_start))
+        self._segment = _open_for_append(path)
+        self._segment_start = segment_start
+
+
+def _list_segments(directory: str) -> List[int]:
+    return sorted(
+        int(match.group(1))
+        for match in map(_SEGMENT_RE.match, os.listdir(directory))
+        if match is not None
+    )
+
+
+def _truncate_from_block(path: str, block_number: int):
+    with open(path, "r+b") as f:
+        start = 0
+        for end, record in _iter_frames(f):
+            if bson.decode(record)["block_number"] >= block_number:
+                f.truncate(start)
+                return
+            start = end
+
+
+def _read_records(path: str) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        for _, record in _iter_frames(f):
+            yield bson.decode(record)
+
+
+def read_contracts(directory: str) -> Iterator[Tuple[bytes, dict]]:
+    """Iterate over the recorded contract classifications."""
+    path = os.path.join(directory, CONTRACTS_FILE)
+    if not os.path.exists(path):
+        return
+    for record in _read_records(path):
+        yield record["address"], record["contract"]
+
+
+def read_blocks(
+    directory: str,
+    from_block: Optional[int] = None,
+    to_block: Optional[int] = None,
+) -> Iterator[Tuple[NewEvents, int]]:
+    """Iterate over the recorded blocks in `[from_block, to_block]`.
+
+    Yields each block events together with its accepted time.
+    """
+    segments = _list_segments(directory)
+
+    last_block = None
+    for i, segment_start in enumerate(segments):
+        next_segment = segments[i + 1] if i + 1 < len(segments) else None
+        if from_block is not None and next_segment is not None:
+            if next_segment <= from_block:
+                continue
+        if to_block is not None and segment_start > to_block:
+            break
+
+        path = os.path.join(directory, _segment_name(segment_start))
+        for record in _read_records(path):
+            block_number = record["block_number"]
+            # Blocks redelivered after a restart are recorded twice.
+            if last_block is not None and block_number <= last_block:
+                continue
+            if from_block is not None and block_number < from_block:
+                continue
+            if to_block is not None and block_number > to_block:
+                return
+            last_block = block_number
+            events = [Event(**event) for event in record["events"]]
+            message = NewEvents(record["block_hash"], block_number, events)
+            yield message, record["accepted_time"]
+
+
+class ReplayError(Exception):
+    """Raised when replay needs data that was not recorded."""
+
+
+class ReplayRpcClient:
+    """Rpc client serving recorded block timestamps during replay."""
+
+    def __init__(self):
+        self.accepted_time = None
+
+    async def get_block_by_hash(self, hash: bytes) -> dict:
+        return {"block_hash": "0x" + hash.hex(), "accepted_time": self.accepted_time}
+
+    async def call(self, address: bytes, method: str, params) -> dict:
+        # Not an RpcError, so that CachedCallRpcClient doesn't cache it.
+        raise ReplayError(f"call to 0x{address.hex()} is not available during replay")
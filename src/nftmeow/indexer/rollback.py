@@ -0,0 +1,84 @@
+"""Roll back the data indexed from a block onward, after a chain reorg."""
+
+from typing import Dict
+
+from pymongo import ASCENDING
+from pymongo.database import Database
+
+from nftmeow import activity, token_layout
+
+# Indexes used by `rollback`, so that it only touches the documents changed
+# by the rolled back blocks.
+TOKENS_INDEXES = [
+    [(token_layout.VALID_FROM, ASCENDING)],
+    [(token_layout.VALID_TO, ASCENDING)],
+    [("_chain.valid_from", ASCENDING)],
+    [("_chain.valid_to", ASCENDING)],
+]
+TRANSFERS_INDEXES = [[("_chain.valid_from", ASCENDING)]]
+
+
+def create_rollback_indexes(db: Database):
+    # Sparse, so that each index only contains the documents of its layout.
+    for keys in TOKENS_INDEXES:
+        db["tokens"].create_index(keys, sparse=True)
+    for keys in TRANSFERS_INDEXES:
+        db["transfers"].create_index(keys)
+
+
+def rollback(db: Database, block_number: int, legacy: bool = True) -> Dict[str, int]:
+    """Remove everything indexed at or after `block_number`.
+
+    Versions created at or after `block_number` are deleted, and versions
+    invalidated at or after it are valid again.
+
+    Returns the number of documents deleted or updated, by collection.
+    Rolling back is idempotent, so it can be repeated if interrupted.
+    """
+    tokens = db["tokens"]
+    transfers = db["transfers"]
+
+    deleted = tokens.delete_many(
+        {token_layout.VALID_FROM: {"$gte": block_number}}
+    ).deleted_count
+    reopened = tokens.update_many(
+        {token_layout.VALID_TO: {"$gte": block_number}},
+        {"$set": {token_layout.VALID_TO: None}},
+    ).modified_count
+    if legacy:
+        deleted += tokens.delete_many(
+            {"_chain.valid_from": {"$gte": block_number}}
+        ).deleted_count
+        reopened += tokens.update_many(
+            {"_chain.valid_to": {"$gte": block_number}},
+            {"$set": {"_chain.valid_to": None}},
+        ).modified_count
+
+    # Transfers and mints are never invalidated, only deleted.
+    transfers_deleted = transfers.delete_many(
+        {"_chain.valid_from": {"$gte": block_number}}
+    ).deleted_count
+    mints_deleted = (
+        db["mints"]
+        .delete_many({"_chain.valid_from": {"$gte": block_number}})
+        .deleted_count
+    )
+
+    # Buckets that counted rolled back blocks are counted again from the
+    # remaining transfers and receivers.
+    db["activity_receivers"].delete_many({"first_block": {"$gte": block_number}})
+    buckets = db["activity"].find(
+        {"last_block": {"$gte": block_number}},
+        {"contract_address": 1, "period": 1, "start": 1},
+    )
+    buckets_recomputed = activity.recompute_buckets(
+        db, ((b["contract_address"], b["period"], b["start"]) for b in buckets)
+    )
+
+    return {
+        "tokens_deleted": deleted,
+        "tokens_reopened": reopened,
+        "transfers_deleted": transfers_deleted,
+        "mints_deleted": mints_deleted,
+        "activity_recomputed": buckets_recomputed,
+    }
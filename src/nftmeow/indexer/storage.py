@@ -24,3 +24,43 @@ class CachedContractStorage:
     def set(self, address, contract):
         data = {**contract, "contract_address": address}
         self._contracts.insert_one(data)
+
+    def set_if_missing(self, address, contract):
+        data = {**contract, "contract_address": address}
+        self._contracts.update_one(
+            {"contract_address": address}, {"$setOnInsert": data}, upsert=True
+        )
+
+    def invalidate(self):
+        """Drop the cached contracts, for example after a rollback."""
+        self._cache.clear()
+
+
+class CachedCallStorage:
+    """Store the results of StarkNet calls that never change."""
+
+    def __init__(self, db):
+        self._cache = LRU(10_000)
+        self._db = db
+        self._calls = self._db["starknet_calls"]
+
+    def get(self, key):
+        existing = self._cache.get(key)
+        if existing is not None:
+            return existing
+        # get from mongo
+        call = self._calls.find_one({"_id": self._call_id(key)})
+        if call is None:
+            return None
+        value = {k: call[k] for k in ("result", "error", "code") if k in call}
+        # update cache
+        self._cache[key] = value
+        return value
+
+    def set(self, key, value):
+        self._calls.replace_one({"_id": self._call_id(key)}, value, upsert=True)
+        self._cache[key] = value
+
+    def _call_id(self, key):
+        contract, selector, calldata = key
+        return {"contract": contract, "selector": selector, "calldata": list(calldata)}
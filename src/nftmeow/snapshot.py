@@ -0,0 +1,297 @@
+"""Export ownership snapshots to compact columnar files.
+
+A snapshot file starts with a small header followed by a sequence of frames.
+Each frame contains up to `ROW_GROUP_SIZE` rows of a single table (and, for
+tokens and transfers, a single collection) stored column by column and
+compressed with zlib. Addresses and token ids are stored as fixed-width
+32 bytes big endian values, timestamps and block numbers as 64 bits integers.
+
+Frames are written as soon as they are full, so memory usage only depends on
+the row group size and the number of parallel jobs.
+"""
+
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from logging import getLogger
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from pymongo.database import Database
+
+from nftmeow import token_layout
+
+logger = getLogger(__name__)
+
+MAGIC = b"NFTMSNAP"
+VERSION = 1
+
+ROW_GROUP_SIZE = 65_536
+MONGO_BATCH_SIZE = 10_000
+
+TABLE_COLLECTIONS = 1
+TABLE_TOKENS = 2
+TABLE_TRANSFERS = 3
+
+_HEADER = struct.Struct(">8sBBQ")
+_FRAME_HEADER = struct.Struct(">B32sII")
+
+_WIDTH = 32
+_NO_ADDRESS = bytes(_WIDTH)
+
+
+def _fixed(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return _NO_ADDRESS
+    if len(value) > _WIDTH:
+        raise ValueError(f"value does not fit in {_WIDTH} bytes")
+    return value.rjust(_WIDTH, b"\x00")
+
+
+def _timestamp(value: Optional[datetime]) -> int:
+    if value is None:
+        return 0
+    return int(value.timestamp())
+
+
+class _Column:
+    """A column of fixed-width values."""
+
+    def __init__(self, fmt: Optional[str] = None):
+        self._fmt = fmt
+        self._values = []
+
+    def append(self, value):
+        self._values.append(value)
+
+    def encode(self) -> bytes:
+        if self._fmt is None:
+            return b"".join(self._values)
+        return struct.pack(f">{len(self._values)}{self._fmt}", *self._values)
+
+
+def _encode_frame(table: int, contract: bytes, row_count: int, columns) -> bytes:
+    payload = zlib.compress(b"".join(c.encode() for c in columns))
+    return _FRAME_HEADER.pack(table, contract, row_count, len(payload)) + payload
+
+
+class SnapshotWriter:
+    """Write frames to a snapshot file, safe to share between threads."""
+
+    def __init__(self, out: BinaryIO, block_number: Optional[int]):
+        self._out = out
+        self._lock = threading.Lock()
+        has_block = block_number is not None
+        self._out.write(_HEADER.pack(MAGIC, VERSION, has_block, block_number or 0))
+
+    def write_frame(self, frame: bytes):
+        with self._lock:
+            self._out.write(frame)
+
+
+class _RowGroup:
+    """Accumulate rows of one table and flush them as frames."""
+
+    def __init__(self, writer: SnapshotWriter, table: int, contract: bytes, formats):
+        self._writer = writer
+        self._table = table
+        self._contract = contract
+        self._formats = formats
+        self.row_count = 0
+        self._reset()
+
+    def _reset(self):
+        self._columns = [_Column(fmt) for fmt in self._formats]
+        self._size = 0
+
+    def append(self, *values):
+        for column, value in zip(self._columns, values):
+            column.append(value)
+        self._size += 1
+        self.row_count += 1
+        if self._size == ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._size == 0:
+            return
+        frame = _encode_frame(self._table, self._contract, self._size, self._columns)
+        self._writer.write_frame(frame)
+        self._reset()
+
+
+# Column formats for each table. `None` means a fixed-width 32 bytes column.
+_TOKENS_COLUMNS = [None, None, "q", "Q"]
+_TRANSFERS_COLUMNS = [None, None, None, "q", "Q"]
+
+
+def _chain_filter(block_number: Optional[int]) -> dict:
+    """Select the documents valid at `block_number`, or the latest ones."""
+    if block_number is None:
+        return {"_chain.valid_to": None}
+    return {
+        "_chain.valid_from": {"$lte": block_number},
+        "$or": [
+            {"_chain.valid_to": None},
+            {"_chain.valid_to": {"$gt": block_number}},
+        ],
+    }
+
+
+@dataclass
+class SnapshotExporter:
+    db: Database
+    block_number: Optional[int] = None
+    jobs: int = 4
+    legacy_tokens: bool = True
+
+    def export(self, out: BinaryIO) -> Dict[str, int]:
+        """Export collections, tokens and transfers to `out`.
+
+        Returns the number of rows exported for each table.
+        """
+        writer = SnapshotWriter(out, self.block_number)
+        addresses = self._export_collections(writer)
+
+        counts = {"collections": len(addresses), "tokens": 0, "transfers": 0}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = executor.map(
+                lambda addr: self._export_collection_data(writer, addr), addresses
+            )
+            for tokens, transfers in results:
+                counts["tokens"] += tokens
+                counts["transfers"] += transfers
+        return counts
+
+    def _export_collections(self, writer: SnapshotWriter) -> List[bytes]:
+        # Names don't have a fixed width, store their length next to the
+        # address and their utf-8 encoding in a third column.
+        contracts = self.db["contracts"].find(
+            {"type": "erc721"}, {"contract_address": 1, "name": 1}
+        )
+        addresses = []
+        group = _RowGroup(writer, TABLE_COLLECTIONS, _NO_ADDRESS, [None, "I", None])
+        for contract in contracts.batch_size(MONGO_BATCH_SIZE):
+            address = contract["contract_address"]
+            name = (contract.get("name") or "").encode("utf-8")
+            addresses.append(address)
+            group.append(_fixed(address), len(name), name)
+        group.flush()
+        logger.info(f"exported {len(addresses)} collections")
+        return addresses
+
+    def _export_collection_data(self, writer: SnapshotWriter, address: bytes):
+        chain_filter = _chain_filter(self.block_number)
+        contract = _fixed(address)
+
+        tokens = _RowGroup(writer, TABLE_TOKENS, contract, _TOKENS_COLUMNS)
+        query = self.db["tokens"].find(
+            token_layout.token_filter(
+                contract=address,
+                current=self.block_number is None,
+                at_block=self.block_number,
+                legacy=self.legacy_tokens,
+            )
+        )
+        for token in query.batch_size(MONGO_BATCH_SIZE):
+            token = token_layout.from_document(token)
+            owners = token["owners"]
+            owner = owners[-1] if owners else None
+            tokens.append(
+                _fixed(token["token_id"]),
+                _fixed(owner),
+                _timestamp(token["updated_at"]),
+                token["_chain"]["valid_from"],
+            )
+        tokens.flush()
+
+        transfers = _RowGroup(writer, TABLE_TRANSFERS, contract, _TRANSFERS_COLUMNS)
+        query = self.db["transfers"].find(
+            {"contract_address": address, **chain_filter},
+            {"token_id": 1, "from": 1, "to": 1, "created_at": 1, "_chain": 1},
+        )
+        for transfer in query.batch_size(MONGO_BATCH_SIZE):
+            transfers.append(
+                _fixed(transfer["token_id"]),
+                _fixed(transfer["from"]),
+                _fixed(transfer["to"]),
+                _timestamp(transfer["created_at"]),
+                transfer["_chain"]["valid_from"],
+            )
+        transfers.flush()
+
+        logger.debug(
+            f"exported collection 0x{address.hex()}: "
+            f"{tokens.row_count} tokens, {transfers.row_count} transfers"
+        )
+        return tokens.row_count, transfers.row_count
+
+
+@dataclass
+class SnapshotFrame:
+    table: int
+    contract: bytes
+    columns: Dict[str, list]
+
+
+_COLUMN_NAMES = {
+    TABLE_COLLECTIONS: ["address", "name"],
+    TABLE_TOKENS: ["token_id", "owner", "updated_at", "valid_from"],
+    TABLE_TRANSFERS: ["token_id", "from", "to", "created_at", "valid_from"],
+}
+
+
+def _split_fixed(data: bytes, offset: int, count: int):
+    end = offset + count * _WIDTH
+    values = [data[i : i + _WIDTH] for i in range(offset, end, _WIDTH)]
+    return values, end
+
+
+def _unpack(data: bytes, offset: int, fmt: str, count: int):
+    s = struct.Struct(f">{count}{fmt}")
+    return list(s.unpack_from(data, offset)), offset + s.size
+
+
+def _decode_frame(table: int, count: int, data: bytes) -> List[list]:
+    if table == TABLE_COLLECTIONS:
+        addresses, offset = _split_fixed(data, 0, count)
+        lengths, offset = _unpack(data, offset, "I", count)
+        names = []
+        for length in lengths:
+            names.append(data[offset : offset + length].decode("utf-8") or None)
+            offset += length
+        return [addresses, names]
+
+    columns = []
+    offset = 0
+    formats = _TOKENS_COLUMNS if table == TABLE_TOKENS else _TRANSFERS_COLUMNS
+    for fmt in formats:
+        if fmt is None:
+            values, offset = _split_fixed(data, offset, count)
+        else:
+            values, offset = _unpack(data, offset, fmt, count)
+        columns.append(values)
+    return columns
+
+
+def read_snapshot(inp: BinaryIO) -> Iterator[SnapshotFrame]:
+    """Iterate over the frames of a snapshot file."""
+    header = inp.read(_HEADER.size)
+    magic, version, _has_block, _block_number = _HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a nftmeow snapshot file")
+
+    while True:
+        frame_header = inp.read(_FRAME_HEADER.size)
+        if not frame_header:
+            return
+        table, contract, count, length = _FRAME_HEADER.unpack(frame_header)
+        data = zlib.decompress(inp.read(length))
+        columns = _decode_frame(table, count, data)
+        yield SnapshotFrame(
+            table=table,
+            contract=contract,
+            columns=dict(zip(_COLUMN_NAMES[table], columns)),
+        )
@@ -1,10 +1,27 @@
 """Make RPC calls to a StarkNet node."""
 
-from typing import Any, List
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
 
 import aiohttp
 from apibara.starknet import get_selector_from_name
 
+# Error codes returned by the node for calls.
+CONTRACT_NOT_FOUND = 20
+INVALID_MESSAGE_SELECTOR = 21
+INVALID_CALL_DATA = 22
+
+# Errors that are the same every time the call is made.
+DETERMINISTIC_CALL_ERRORS = (INVALID_MESSAGE_SELECTOR, INVALID_CALL_DATA)
+
+
+class RpcError(RuntimeError):
+    """Error returned by the node, with its JSON-RPC error code."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
 
 class StarkNetRpcClient:
     def __init__(self, url):
@@ -17,7 +34,8 @@ class StarkNetRpcClient:
                 response = await response.json()
                 if "result" in response:
                     return response["result"]
-                raise RuntimeError(response["error"]["message"])
+                error = response["error"]
+                raise RpcError(error["message"], error.get("code"))
 
     async def get_block_by_hash(self, hash: bytes):
         return await self._request(
@@ -28,9 +46,52 @@ class StarkNetRpcClient:
         params = [
             {
                 "contract_address": "0x" + contract.hex(),
-                "entry_point_selector": hex(get_selector_from_name(method)),
+                "entry_point_selector": selector_from_name(method),
                 "calldata": params,
             },
             "latest",
         ]
         return await self._request("starknet_call", params)
+
+
+@lru_cache(maxsize=None)
+def selector_from_name(method: str) -> str:
+    return hex(get_selector_from_name(method))
+
+
+CallKey = Tuple[bytes, str, Tuple[str, ...]]
+
+
+class CachedCallRpcClient:
+    """Wrap a rpc client to cache the result of `call`.
+
+    Only use it for calls whose result never changes for a given contract,
+    like the methods used to classify contracts. Errors that don't depend on
+    when the call is made, like missing entry points, are cached too and
+    raised again. Other errors, like rate limits, are raised without caching.
+
+    `storage` must implement `get(key)` and `set(key, value)`, where `key` is
+    `(contract, selector, calldata)`.
+    """
+
+    def __init__(self, rpc, storage):
+        self._rpc = rpc
+        self._storage = storage
+
+    async def get_block_by_hash(self, hash: bytes):
+        return await self._rpc.get_block_by_hash(hash)
+
+    async def call(self, contract: bytes, method: str, params: List[Any]):
+        key = (contract, selector_from_name(method), tuple(params))
+        cached = self._storage.get(key)
+        if cached is None:
+            try:
+                cached = {"result": await self._rpc.call(contract, method, params)}
+            except RpcError as err:
+                if err.code not in DETERMINISTIC_CALL_ERRORS:
+                    raise
+                cached = {"error": str(err), "code": err.code}
+            self._storage.set(key, cached)
+        if "error" in cached:
+            raise RpcError(cached["error"], cached.get("code"))
+        return cached["result"]
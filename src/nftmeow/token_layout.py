@@ -0,0 +1,235 @@
+"""Layout of the documents in the `tokens` collection.
+
+Tokens used to be stored as (v1):
+
+    {
+        "contract_address": bytes,
+        "token_id": bytes,  # padded to 32 bytes
+        "updated_at": datetime,
+        "owners": [bytes],
+        "_chain": {"valid_from": int, "valid_to": Optional[int]},
+    }
+
+Since ERC-721 tokens have exactly one owner, they are now stored as (v2):
+
+    {
+        "c": bytes,  # contract address
+        "t": bytes,  # token id, without leading zero bytes
+        "o": bytes,  # owner
+        "u": datetime,  # updated at
+        "f": int,  # valid from
+        "v": Optional[int],  # valid to
+        "k": int,  # key of the event that created it, see `indexer.batch`
+    }
+
+The `migrate-tokens` command rewrites v1 documents to v2. Until it has
+completed, queries must match both layouts: use `token_filter` to build them
+and `from_document` to read documents in either layout.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, List, Optional
+
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.database import Database
+
+CONTRACT = "c"
+TOKEN_ID = "t"
+OWNER = "o"
+UPDATED_AT = "u"
+VALID_FROM = "f"
+VALID_TO = "v"
+
+LAYOUT_VERSION = 2
+
+_LEGACY_FIELDS = ("contract_address", "token_id", "owners", "_chain")
+
+INDEXES = [
+    [(CONTRACT, ASCENDING), (TOKEN_ID, ASCENDING), (VALID_TO, ASCENDING)],
+    [(OWNER, ASCENDING)],
+]
+
+
+def encode_token_id(token_id: bytes) -> bytes:
+    """Strip the leading zero bytes from a token id."""
+    return token_id.lstrip(b"\x00") or b"\x00"
+
+
+def decode_token_id(token_id: bytes) -> bytes:
+    """Pad a token id back to 32 bytes."""
+    return token_id.rjust(32, b"\x00")
+
+
+def to_document(
+    contract_address: bytes,
+    token_id: bytes,
+    owner: bytes,
+    updated_at: datetime,
+    valid_from: int,
+    valid_to: Optional[int] = None,
+) -> dict:
+    return {
+        CONTRACT: contract_address,
+        TOKEN_ID: encode_token_id(token_id),
+        OWNER: owner,
+        UPDATED_AT: updated_at,
+        VALID_FROM: valid_from,
+        VALID_TO: valid_to,
+    }
+
+
+def from_document(doc: dict) -> dict:
+    """Read a token document in either layout, returns it in the v1 layout."""
+    if CONTRACT not in doc:
+        return doc
+    return {
+        "_id": doc["_id"],
+        "contract_address": doc[CONTRACT],
+        "token_id": decode_token_id(doc[TOKEN_ID]),
+        "owners": [doc[OWNER]],
+        "updated_at": doc[UPDATED_AT],
+        "_chain": {"valid_from": doc[VALID_FROM], "valid_to": doc[VALID_TO]},
+    }
+
+
+def _upgrade_document(doc: dict) -> dict:
+    owners = doc["owners"]
+    return to_document(
+        doc["contract_address"],
+        doc["token_id"],
+        owners[-1] if owners else None,
+        doc["updated_at"],
+        doc["_chain"]["valid_from"],
+        doc["_chain"]["valid_to"],
+    )
+
+
+def token_filter(
+    contract: Any = None,
+    token_id: Any = None,
+    owner: Any = None,
+    current: bool = False,
+    at_block: Optional[int] = None,
+    legacy: bool = True,
+) -> dict:
+    """Build a filter over tokens.
+
+    `contract` and `owner` are mongo conditions over addresses, `token_id`
+    over 32 bytes token ids (either a value, `$eq` or `$in`). If `current`
+    only the latest version of tokens is returned, if `at_block` only the
+    version valid at that block.
+
+    If `legacy` the filter matches both v1 and v2 documents.
+    """
+    filter = dict()
+    legacy_filter = dict()
+    if contract is not None:
+        filter[CONTRACT] = contract
+        legacy_filter["contract_address"] = contract
+    if token_id is not None:
+        filter[TOKEN_ID] = _map_condition(token_id, encode_token_id)
+        legacy_filter["token_id"] = token_id
+    if owner is not None:
+        filter[OWNER] = owner
+        legacy_filter["owners"] = {"$elemMatch": owner}
+    if current:
+        filter[VALID_TO] = None
+        legacy_filter["_chain.valid_to"] = None
+    if at_block is not None:
+        filter[VALID_FROM] = {"$lte": at_block}
+        filter["$or"] = [{VALID_TO: None}, {VALID_TO: {"$gt": at_block}}]
+        legacy_filter["_chain.valid_from"] = {"$lte": at_block}
+        legacy_filter["$or"] = [
+            {"_chain.valid_to": None},
+            {"_chain.valid_to": {"$gt": at_block}},
+        ]
+
+    if not legacy:
+        return filter
+    # Make sure the filter doesn't match documents in the other layout
+    filter[CONTRACT] = filter.get(CONTRACT, {"$exists": True})
+    legacy_filter["contract_address"] = legacy_filter.get(
+        "contract_address", {"$exists": True}
+    )
+    return {"$or": [filter, legacy_filter]}
+
+
+def _map_condition(condition, f):
+    if isinstance(condition, bytes):
+        return f(condition)
+    return {op: _map_value(value, f) for op, value in condition.items()}
+
+
+def _map_value(value, f):
+    if isinstance(value, list):
+        return [f(v) for v in value]
+    return f(value)
+
+
+def is_migrated(db: Database) -> bool:
+    """Returns True if all tokens are stored in the current layout."""
+    migration = db["migrations"].find_one({"_id": "tokens"})
+    return migration is not None and migration["version"] >= LAYOUT_VERSION
+
+
+def create_indexes(db: Database):
+    for keys in INDEXES:
+        db["tokens"].create_index(keys)
+
+
+def migrate(
+    db: Database, batch_size: int = 1_000, pause: float = 0, on_batch=None
+) -> int:
+    """Rewrite v1 token documents to v2, in batches.
+
+    Documents updated by the indexer while being migrated are skipped and
+    picked up again by the next batch. Sleep `pause` seconds between batches
+    to limit the load on the database. Returns the number of documents
+    migrated.
+    """
+    create_indexes(db)
+
+    tokens = db["tokens"]
+    migrated = 0
+    while True:
+        batch = list(
+            tokens.find({"contract_address": {"$exists": True}})
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+        requests = [
+            ReplaceOne(
+                {
+                    "_id": doc["_id"],
+                    "contract_address": {"$exists": True},
+                    "_chain.valid_to": doc["_chain"]["valid_to"],
+                },
+                _upgrade_document(doc),
+            )
+            for doc in batch
+        ]
+        result = tokens.bulk_write(requests, ordered=False)
+        migrated += result.modified_count
+        if on_batch is not None:
+            on_batch(migrated)
+        if pause:
+            time.sleep(pause)
+
+    db["migrations"].update_one(
+        {"_id": "tokens"}, {"$set": {"version": LAYOUT_VERSION}}, upsert=True
+    )
+    return migrated
+
+
+def drop_legacy_indexes(db: Database) -> List[str]:
+    """Drop the indexes over v1 fields. Returns the names of dropped indexes."""
+    dropped = []
+    for name, info in db["tokens"].index_information().items():
+        fields = [field for field, _ in info["key"]]
+        if any(field.split(".")[0] in _LEGACY_FIELDS for field in fields):
+            db["tokens"].drop_index(name)
+            dropped.append(name)
+    return dropped
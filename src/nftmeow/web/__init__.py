@@ -1,62 +1,160 @@
 """NFTMeow GraphQL server."""
 
 import asyncio
+import time
 from logging import getLogger
-from typing import List
+from typing import List, Optional
 
 import strawberry
 from aiohttp import web
 from pymongo import MongoClient
 from strawberry.aiohttp.views import GraphQLView
 
+from nftmeow import token_layout
+from nftmeow.web.activity import ActivityBucket, Mint, get_activity, get_mints
 from nftmeow.web.collection import (Collection, collection_loader,
-                                    get_collections)
+                                    get_collections, search_collections)
 from nftmeow.web.context import Context
+from nftmeow.web.cost import DEFAULT_MAX_COST, query_cost_limiter
+from nftmeow.web.feed import TransferFeed
 from nftmeow.web.pagination import Connection
+from nftmeow.web.response import NFTMeowHTTPHandler, compression_middleware
+from nftmeow.web.search import CollectionSearchIndex
 from nftmeow.web.token import (Token, get_tokens,
                                tokens_by_address_token_id_loader)
-from nftmeow.web.transfer import Transfer, get_transfers
+from nftmeow.web.tracing import (DEFAULT_EXPLAIN_SAMPLE_RATE, DEFAULT_SLOW_MS,
+                                 RequestTrace, SlowQueryLogger,
+                                 resolver_tracer)
+from nftmeow.web.transfer import Transfer, get_transfers, new_transfers
 
 logger = getLogger(__name__)
 
+# How often to check if the tokens migration has completed.
+TOKENS_MIGRATION_CHECK_INTERVAL = 60
+
 
 @strawberry.type
 class Query:
     collections: Connection[Collection] = strawberry.field(resolver=get_collections)
+    search_collections: List[Collection] = strawberry.field(resolver=search_collections)
     transfers: Connection[Transfer] = strawberry.field(resolver=get_transfers)
     tokens: Connection[Token] = strawberry.field(resolver=get_tokens)
+    mints: Connection[Mint] = strawberry.field(resolver=get_mints)
+    activity: List[ActivityBucket] = strawberry.field(resolver=get_activity)
+
+
+@strawberry.type
+class Subscription:
+    new_transfers: Transfer = strawberry.subscription(resolver=new_transfers)
 
 
 class NFTMeowGraphQLView(GraphQLView):
-    def __init__(self, mongo_url: str, db_name: str, **kwargs):
+    http_handler_class = NFTMeowHTTPHandler
+
+    def __init__(
+        self,
+        mongo_url: str,
+        db_name: str,
+        trace: bool = False,
+        slow_query_logger: Optional[SlowQueryLogger] = None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
-        self._mongo = MongoClient(mongo_url)
+        listeners = [slow_query_logger] if slow_query_logger is not None else []
+        self._mongo = MongoClient(mongo_url, event_listeners=listeners)
+        if slow_query_logger is not None:
+            slow_query_logger.client = self._mongo
+        self._trace = trace
         self._db = self._mongo[db_name]
+        self._transfer_feed = TransferFeed(self._db)
+        self._collection_search = CollectionSearchIndex(self._db)
+        self._legacy_tokens = True
+        self._legacy_tokens_checked_at = 0
+
+    async def cleanup(self, _app: web.Application):
+        await self._collection_search.close()
+
+    async def _has_legacy_tokens(self) -> bool:
+        if not self._legacy_tokens:
+            return False
+        now = time.monotonic()
+        if now - self._legacy_tokens_checked_at > TOKENS_MIGRATION_CHECK_INTERVAL:
+            # Set first, so that concurrent requests don't check it too.
+            self._legacy_tokens_checked_at = now
+            loop = asyncio.get_running_loop()
+            migrated = await loop.run_in_executor(
+                None, token_layout.is_migrated, self._db
+            )
+            self._legacy_tokens = not migrated
+        return self._legacy_tokens
 
     async def get_context(
-        self, _request: web.Request, _response: web.StreamResponse
+        self, request: web.Request, response: web.StreamResponse
     ) -> Context:
-        return Context(
+        # Subscriptions share the context for the whole connection, don't
+        # cache loaded tokens or they would go stale.
+        cache = not isinstance(response, web.WebSocketResponse)
+        legacy_tokens = await self._has_legacy_tokens()
+        context = Context(
             db=self._db,
-            collection_loader=collection_loader(self._db),
+            collection_loader=collection_loader(self._db, cache=cache),
             tokens_by_address_token_id_loader=tokens_by_address_token_id_loader(
-                self._db
+                self._db, cache=cache, legacy=legacy_tokens
             ),
+            transfer_feed=self._transfer_feed,
+            collection_search=self._collection_search,
+            legacy_tokens=legacy_tokens,
         )
+        # Subscriptions are long lived, only trace queries.
+        if self._trace and cache:
+            context.trace = RequestTrace()
+            context.trace.trace_loader("collection", context.collection_loader)
+            context.trace.trace_loader(
+                "token", context.tokens_by_address_token_id_loader
+            )
+        return context
 
 
-async def start_web_server(host: str, port: int, mongo_url: str, db_name: str):
-    schema = strawberry.Schema(query=Query)
-    view = NFTMeowGraphQLView(mongo_url, db_name, schema=schema)
+async def start_web_server(
+    host: str,
+    port: int,
+    mongo_url: str,
+    db_name: str,
+    max_query_cost: int = DEFAULT_MAX_COST,
+    trace: bool = False,
+    slow_ms: float = DEFAULT_SLOW_MS,
+    explain_sample_rate: float = DEFAULT_EXPLAIN_SAMPLE_RATE,
+):
+    extensions = [query_cost_limiter(max_query_cost)]
+    slow_query_logger = None
+    if trace:
+        extensions.append(resolver_tracer(slow_ms))
+        slow_query_logger = SlowQueryLogger(slow_ms, explain_sample_rate)
+    schema = strawberry.Schema(
+        query=Query,
+        subscription=Subscription,
+        extensions=extensions,
+    )
+    view = NFTMeowGraphQLView(
+        mongo_url,
+        db_name,
+        trace=trace,
+        slow_query_logger=slow_query_logger,
+        schema=schema,
+    )
 
-    app = web.Application()
+    app = web.Application(middlewares=[compression_middleware])
     app.router.add_route("*", "/graphql", view)
+    app.on_cleanup.append(view.cleanup)
 
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, host, port)
-    await site.start()
-    logger.info(f"GraphQL server started: {host}:{port}")
+    try:
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logger.info(f"GraphQL server started: {host}:{port}")
 
-    while True:
-        await asyncio.sleep(10_000)
+        while True:
+            await asyncio.sleep(10_000)
+    finally:
+        await runner.cleanup()
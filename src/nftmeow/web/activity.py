@@ -0,0 +1,139 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+import strawberry
+from strawberry import UNSET
+
+from nftmeow.web.context import Info
+from nftmeow.web.pagination import Connection, Cursor, Edge, Filter, PageInfo
+from nftmeow.web.scalar import Address, TokenId
+from nftmeow.web.token import Token, get_token_by_address_and_id
+
+
+@strawberry.enum
+class ActivityPeriod(Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+@strawberry.type
+class Mint:
+    to_address: Address
+    time: datetime
+
+    _contract_address: strawberry.Private[Address]
+    _token_id: strawberry.Private[TokenId]
+
+    @strawberry.field
+    async def token(self, info: Info) -> Token:
+        return await get_token_by_address_and_id(
+            info.context, self._contract_address, self._token_id
+        )
+
+    @classmethod
+    def from_mongo(cls, data: dict) -> "Mint":
+        return Mint(
+            to_address=data["to"],
+            time=data["created_at"],
+            _contract_address=data["contract_address"],
+            _token_id=data["token_id"],
+        )
+
+    @classmethod
+    def build_cursor(_cls, data: dict) -> str:
+        return str(data["event_key"])
+
+
+@strawberry.type
+class ActivityBucket:
+    """Activity of a collection over an hour or a day."""
+
+    collection_address: Address
+    start: datetime
+    mints: int
+    transfers: int
+    unique_receivers: int
+
+    @classmethod
+    def from_mongo(cls, data: dict) -> "ActivityBucket":
+        return ActivityBucket(
+            collection_address=data["contract_address"],
+            start=data["start"],
+            mints=data["mints"],
+            transfers=data["transfers"],
+            unique_receivers=data["unique_receivers"],
+        )
+
+
+def get_mints(
+    info: Info,
+    first: int = 10,
+    after: Optional[Cursor] = UNSET,
+    collection: Optional[Filter[Address]] = UNSET,
+) -> Connection[Mint]:
+    """Most recent mints first."""
+    if first < 1:
+        raise ValueError("first must be greater than equal 1")
+    if first > 200:
+        raise ValueError("first must be less than equal 200")
+
+    db = info.context.db
+
+    filter = dict()
+    if collection is not UNSET:
+        filter["contract_address"] = collection.mongo_filter()
+
+    if after is not UNSET:
+        filter["event_key"] = {"$lt": int(after)}
+
+    query = db["mints"].find(filter).sort("event_key", -1).limit(first + 1)
+
+    mints = list(query)
+
+    edges = [
+        Edge(node=Mint.from_mongo(m), cursor=Mint.build_cursor(m))
+        for m in mints[:first]
+    ]
+
+    page_info = PageInfo(
+        has_previous_page=after is not UNSET,
+        has_next_page=len(mints) == first + 1,
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+    )
+
+    return Connection(page_info=page_info, edges=edges)
+
+
+def get_activity(
+    info: Info,
+    collection: Address,
+    period: ActivityPeriod = ActivityPeriod.HOUR,
+    first: int = 24,
+) -> List[ActivityBucket]:
+    """Activity of the collection in the most recent `first` periods with any."""
+    if first < 1:
+        raise ValueError("first must be greater than equal 1")
+    if first > 200:
+        raise ValueError("first must be less than equal 200")
+
+    db = info.context.db
+
+    buckets = (
+        db["activity"]
+        .find(
+            {"contract_address": collection, "period": period.value},
+            {
+                "contract_address": 1,
+                "start": 1,
+                "mints": 1,
+                "transfers": 1,
+                "unique_receivers": 1,
+            },
+        )
+        .sort("start", -1)
+        .limit(first)
+    )
+
+    return [ActivityBucket.from_mongo(b) for b in buckets]
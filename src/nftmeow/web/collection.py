@@ -87,5 +87,21 @@ def get_collections(
     return Connection(page_info=page_info, edges=edges[:-1])
 
 
-def collection_loader(db):
-    return DataLoader(CollectionLoader(db))
+async def search_collections(
+    info: Info, prefix: str, first: int = 10
+) -> List[Collection]:
+    """Collections with a word of their name starting with `prefix`.
+
+    Matches are case insensitive, sorted by the matching part of the name.
+    """
+    if first < 1:
+        raise ValueError("first must be greater than equal 1")
+    if first > 200:
+        raise ValueError("first must be less than equal 200")
+
+    matches = await info.context.collection_search.search(prefix, first)
+    return [Collection(address=address, name=name) for address, name in matches]
+
+
+def collection_loader(db, cache=True):
+    return DataLoader(CollectionLoader(db), cache=cache)
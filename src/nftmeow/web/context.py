@@ -1,16 +1,24 @@
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Optional
 
 from pymongo.database import Database
 from strawberry.dataloader import DataLoader
 from strawberry.types import Info as StrawberryInfo
 
+from nftmeow.web.feed import TransferFeed
+from nftmeow.web.search import CollectionSearchIndex
+from nftmeow.web.tracing import RequestTrace
+
 
 @dataclass
 class Context:
     db: Database
     collection_loader: DataLoader
     tokens_by_address_token_id_loader: DataLoader
+    transfer_feed: TransferFeed
+    collection_search: CollectionSearchIndex
+    legacy_tokens: bool
+    trace: Optional[RequestTrace] = None
 
 
 Info = StrawberryInfo[Context, Any]
@@ -0,0 +1,121 @@
+"""Estimate the cost of GraphQL queries before executing them."""
+
+from typing import Dict, Optional, Type
+
+from graphql import (ExecutionResult, FieldNode, FragmentDefinitionNode,
+                     FragmentSpreadNode, GraphQLError, GraphQLObjectType,
+                     InlineFragmentNode, SelectionSetNode, get_named_type,
+                     get_operation_ast, is_composite_type)
+from graphql.execution.values import get_argument_values, get_variable_values
+from strawberry.extensions import Extension
+
+DEFAULT_MAX_COST = 5_000
+
+
+class QueryCostLimiter(Extension):
+    """Reject queries whose estimated cost is over `max_cost`.
+
+    Every field returning an object costs 1. Fields with a `first` argument
+    multiply the cost of their selection by the number of items requested,
+    so that nested loaders and repeated aliases are all accounted for.
+
+    The cost is computed after validation, before any resolver runs, and it's
+    returned in the `cost` response extension. Queries whose variables don't
+    match their types are not estimated, execution reports the error.
+    """
+
+    max_cost: int = DEFAULT_MAX_COST
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self._cost: Optional[int] = None
+
+    def on_executing_start(self):
+        ctx = self.execution_context
+        operation = get_operation_ast(ctx.graphql_document, ctx.operation_name)
+        if operation is None:
+            return
+
+        schema = ctx.schema._schema
+        variables = get_variable_values(
+            schema, operation.variable_definitions or [], ctx.variables or {}
+        )
+        if not isinstance(variables, dict):
+            return
+
+        root_type = schema.get_root_type(operation.operation)
+        fragments = {
+            definition.name.value: definition
+            for definition in ctx.graphql_document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        estimator = _CostEstimator(schema, fragments, variables)
+        self._cost = estimator.selection_set_cost(operation.selection_set, root_type)
+
+        if self._cost > self.max_cost:
+            error = GraphQLError(
+                f"query cost {self._cost} is over the maximum of {self.max_cost}"
+            )
+            # Setting the result skips execution entirely.
+            ctx.result = ExecutionResult(data=None, errors=[error])
+
+    def get_results(self) -> Dict[str, Dict[str, int]]:
+        if self._cost is None:
+            return {}
+        return {"cost": {"requested": self._cost, "maximum": self.max_cost}}
+
+
+def query_cost_limiter(max_cost: int) -> Type[QueryCostLimiter]:
+    """Create a `QueryCostLimiter` extension with the given budget."""
+    return type("QueryCostLimiter", (QueryCostLimiter,), {"max_cost": max_cost})
+
+
+class _CostEstimator:
+    def __init__(self, schema, fragments, variables):
+        self._schema = schema
+        self._fragments = fragments
+        self._variables = variables
+
+    def selection_set_cost(
+        self, selection_set: SelectionSetNode, parent_type: GraphQLObjectType
+    ) -> int:
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self._field_cost(selection, parent_type)
+            elif isinstance(selection, InlineFragmentNode):
+                cost += self.selection_set_cost(
+                    selection.selection_set,
+                    self._type_condition(selection, parent_type),
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self._fragments[selection.name.value]
+                cost += self.selection_set_cost(
+                    fragment.selection_set, self._type_condition(fragment, parent_type)
+                )
+        return cost
+
+    def _type_condition(self, fragment, parent_type):
+        if fragment.type_condition is None:
+            return parent_type
+        return self._schema.get_type(fragment.type_condition.name.value)
+
+    def _field_cost(self, node: FieldNode, parent_type: GraphQLObjectType) -> int:
+        field_name = node.name.value
+        if field_name.startswith("__"):
+            return 0
+        field = parent_type.fields.get(field_name)
+        if field is None:
+            return 0
+        field_type = get_named_type(field.type)
+        if not is_composite_type(field_type) or node.selection_set is None:
+            return 0
+
+        multiplier = 1
+        if "first" in field.args:
+            args = get_argument_values(field, node, self._variables)
+            first = args.get("first")
+            if isinstance(first, int):
+                multiplier = max(first, 1)
+
+        return 1 + multiplier * self.selection_set_cost(node.selection_set, field_type)
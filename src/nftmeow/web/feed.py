@@ -0,0 +1,88 @@
+import asyncio
+from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import AsyncIterator, List, Optional, Set
+
+from bson import ObjectId
+from pymongo.database import Database
+
+logger = getLogger(__name__)
+
+
+class TransferFeed:
+    """Tail newly indexed transfers and fan them out to all subscribers.
+
+    A single task polls the `transfers` collection for documents newer than
+    the last one seen, so the load on MongoDB does not depend on the number
+    of subscribers. Filtering is left to the subscribers.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        poll_interval: float = 2.0,
+        batch_size: int = 1_000,
+        queue_size: int = 1_000,
+    ):
+        self._db = db
+        self._poll_interval = poll_interval
+        self._batch_size = batch_size
+        self._queue_size = queue_size
+        self._queues: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[ObjectId] = None
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        """Subscribe to new transfers, yields a queue of transfer documents."""
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        self._queues.add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            yield queue
+        finally:
+            self._queues.discard(queue)
+            if not self._queues and self._task is not None:
+                self._task.cancel()
+                self._task = None
+                self._last_id = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        if self._last_id is None:
+            self._last_id = await loop.run_in_executor(None, self._latest_id)
+        while True:
+            try:
+                transfers = await loop.run_in_executor(None, self._fetch_new)
+            except Exception:
+                logger.exception("failed to fetch new transfers")
+                transfers = []
+            for transfer in transfers:
+                self._publish(transfer)
+            if len(transfers) < self._batch_size:
+                await asyncio.sleep(self._poll_interval)
+
+    def _latest_id(self) -> Optional[ObjectId]:
+        latest = self._db["transfers"].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        if latest is None:
+            return None
+        return latest["_id"]
+
+    def _fetch_new(self) -> List[dict]:
+        filter = dict()
+        if self._last_id is not None:
+            filter["_id"] = {"$gt": self._last_id}
+        query = self._db["transfers"].find(filter).sort("_id", 1)
+        transfers = list(query.limit(self._batch_size))
+        if transfers:
+            self._last_id = transfers[-1]["_id"]
+        return transfers
+
+    def _publish(self, transfer: dict):
+        for queue in self._queues:
+            if queue.full():
+                # Slow subscriber: drop its oldest transfer instead of
+                # blocking everyone else.
+                queue.get_nowait()
+            queue.put_nowait(transfer)
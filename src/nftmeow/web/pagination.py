@@ -68,6 +68,19 @@ class Filter(Generic[GenericType]):
 
         raise ValueError("one of eq, ne, or in must be set")
 
+    def matches(self, value) -> bool:
+        """Evaluate the filter in memory, like `mongo_filter` would."""
+        if self.eq is not None:
+            return value == self.eq
+
+        if self.ne is not None:
+            return value != self.ne
+
+        if self.in_ is not None:
+            return value in self.in_
+
+        raise ValueError("one of eq, ne, or in must be set")
+
 
 def cursor_from_mongo_id(id: ObjectId) -> str:
     """Generate a Relay-compatible cursor from the mongodb object id."""
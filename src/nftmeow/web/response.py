@@ -0,0 +1,121 @@
+"""Encode and compress GraphQL responses."""
+
+import json
+from typing import Dict, Literal, Optional, Union
+
+from aiohttp import hdrs, web
+from strawberry.aiohttp.handlers import HTTPHandler
+from strawberry.http import GraphQLRequestData
+from strawberry.schema.exceptions import InvalidOperationTypeError
+from strawberry.types.graphql import OperationType
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Don't bother compressing small responses, the headers are bigger than
+# what we would save.
+MIN_COMPRESS_SIZE = 1_024
+BROTLI_QUALITY = 4
+
+
+def encode_json(data) -> bytes:
+    """Encode the response data to json, using orjson if it's installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+class NFTMeowHTTPHandler(HTTPHandler):
+    """Same as strawberry's handler, but with a faster json encoder."""
+
+    async def execute_request(
+        self,
+        request: web.Request,
+        request_data: GraphQLRequestData,
+        method: Union[Literal["GET"], Literal["POST"]],
+    ) -> web.StreamResponse:
+        response = web.Response()
+        context = await self.get_context(request, response)
+        root_value = await self.get_root_value(request)
+
+        allowed_operation_types = OperationType.from_http(method)
+
+        if not self.allow_queries_via_get and method == "GET":
+            allowed_operation_types = allowed_operation_types - {OperationType.QUERY}
+
+        try:
+            result = await self.schema.execute(
+                query=request_data.query,
+                root_value=root_value,
+                variable_values=request_data.variables,
+                context_value=context,
+                allowed_operation_types=allowed_operation_types,
+            )
+        except InvalidOperationTypeError as e:
+            raise web.HTTPBadRequest(
+                reason=e.as_http_error_reason(method=method)
+            ) from e
+
+        response_data = await self.process_result(request, result)
+        response.body = encode_json(response_data)
+        response.content_type = "application/json"
+        return response
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into the quality of each coding."""
+    encodings = dict()
+    for item in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[coding] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best coding the client accepts, brotli first, or None."""
+    encodings = accepted_encodings(accept_encoding)
+    codings = ["br", "gzip", "deflate"] if brotli is not None else ["gzip", "deflate"]
+    for coding in codings:
+        if encodings.get(coding, encodings.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+@web.middleware
+async def compression_middleware(request: web.Request, handler):
+    """Compress responses with brotli or gzip, depending on the client."""
+    response = await handler(request)
+    if not isinstance(response, web.Response) or response.body is None:
+        return response
+    if hdrs.CONTENT_ENCODING in response.headers:
+        return response
+    if len(response.body) < MIN_COMPRESS_SIZE:
+        return response
+
+    coding = choose_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+    if coding is None:
+        return response
+    response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    if coding == "br":
+        response.body = brotli.compress(response.body, quality=BROTLI_QUALITY)
+        response.headers[hdrs.CONTENT_ENCODING] = "br"
+    else:
+        response.enable_compression(web.ContentCoding(coding))
+    return response
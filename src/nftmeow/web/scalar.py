@@ -1,4 +1,5 @@
 from enum import Enum
+from functools import lru_cache
 from typing import NewType
 
 import strawberry
@@ -48,6 +49,9 @@ def _parse_address(value: str) -> "Address":
     return bytes.fromhex(value.replace("0x", "").zfill(64))
 
 
+# The same few addresses (popular collections and owners) appear many times
+# in a page of results, keep their hex encoding around.
+@lru_cache(maxsize=10_000)
 def _serialize_address(addr: "Address") -> str:
     return "0x" + addr.zfill(32).hex()
 
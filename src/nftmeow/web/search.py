@@ -0,0 +1,137 @@
+import asyncio
+from bisect import bisect_left
+from contextlib import suppress
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.database import Database
+
+logger = getLogger(__name__)
+
+# Above this many new names, the index is sorted again instead.
+_MAX_INSERTS = 64
+
+
+def _normalize(text: str) -> str:
+    return text.casefold()
+
+
+class CollectionSearchIndex:
+    """Search ERC-721 collections by name prefix, in memory.
+
+    Names are kept in a sorted array of keys, one for the full name and one
+    for each word after the first, so that prefixes of any word match. A
+    prefix search is a binary search followed by a scan of the matches.
+
+    The index is loaded on the first search, then a single task polls the
+    `contracts` collection for contracts newer than the last one seen, until
+    `close` is called.
+    """
+
+    def __init__(self, db: Database, poll_interval: float = 10.0):
+        self._db = db
+        self._poll_interval = poll_interval
+        self._keys: List[str] = []
+        self._entries: List[Tuple[str, bytes]] = []
+        self._names: Dict[bytes, str] = dict()
+        self._last_id: Optional[ObjectId] = None
+        self._loaded: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def search(self, prefix: str, first: int) -> List[Tuple[bytes, str]]:
+        """Return up to `first` collections, as (address, name), by name."""
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._load())
+        try:
+            await asyncio.shield(self._loaded)
+        except Exception:
+            # Try loading again on the next search.
+            self._loaded = None
+            raise
+        return self.find(prefix, first)
+
+    async def close(self):
+        """Stop loading and polling the index."""
+        for task in (self._loaded, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        self._loaded = None
+        self._task = None
+
+    def find(self, prefix: str, first: int) -> List[Tuple[bytes, str]]:
+        """Search the collections already in the index."""
+        prefix = _normalize(prefix)
+        seen = set()
+        results = []
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and len(results) < first:
+            if not self._keys[i].startswith(prefix):
+                break
+            _, address = self._entries[i]
+            if address not in seen:
+                seen.add(address)
+                results.append((address, self._names[address]))
+            i += 1
+        return results
+
+    def refresh(self) -> int:
+        """Add the contracts created since the last refresh, synchronously."""
+        return self.add(self._fetch_new())
+
+    def add(self, contracts: List[dict]) -> int:
+        entries = []
+        for contract in contracts:
+            self._last_id = contract["_id"]
+            name = contract.get("name")
+            address = contract["contract_address"]
+            if not name or address in self._names:
+                continue
+            self._names[address] = name
+            words = name.split()
+            for i in range(len(words)):
+                entries.append((_normalize(" ".join(words[i:])), address))
+
+        if len(entries) > _MAX_INSERTS:
+            # Sorting once is cheaper than many inserts, like on first load.
+            self._entries.extend(entries)
+            self._entries.sort()
+            self._keys = [key for key, _ in self._entries]
+        else:
+            for entry in entries:
+                index = bisect_left(self._entries, entry)
+                self._entries.insert(index, entry)
+                self._keys.insert(index, entry[0])
+        return len(contracts)
+
+    async def _load(self):
+        loop = asyncio.get_running_loop()
+        contracts = await loop.run_in_executor(None, self._fetch_new)
+        self.add(contracts)
+        logger.info(f"Loaded {len(self._names)} collections in the search index")
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                contracts = await loop.run_in_executor(None, self._fetch_new)
+            except Exception:
+                logger.exception("failed to fetch new collections")
+                continue
+            # Mutate the index on the event loop, where searches run.
+            self.add(contracts)
+
+    def _fetch_new(self) -> List[dict]:
+        filter = {"type": "erc721"}
+        if self._last_id is not None:
+            filter["_id"] = {"$gt": self._last_id}
+        query = (
+            self._db["contracts"]
+            .find(filter, {"contract_address": 1, "name": 1})
+            .sort("_id", 1)
+        )
+        return list(query)
@@ -1,4 +1,3 @@
-from audioop import add
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
@@ -7,6 +6,7 @@ from pymongo.database import Database
 from strawberry import UNSET
 from strawberry.dataloader import DataLoader
 
+from nftmeow import token_layout
 from nftmeow.web.collection import Collection, get_collection
 from nftmeow.web.context import Context, Info
 from nftmeow.web.pagination import (Connection, Cursor, Edge, Filter, PageInfo,
@@ -27,6 +27,7 @@ class Token:
 
     @classmethod
     def from_mongo(cls, data: dict) -> "Token":
+        data = token_layout.from_document(data)
         return cls(
             token_id=data["token_id"],
             owners=data["owners"],
@@ -60,12 +61,11 @@ def get_tokens(
 
     db = info.context.db
 
-    filter = dict()
-    if collection is not UNSET:
-        filter["contract_address"] = collection.mongo_filter()
-
-    if owner is not UNSET:
-        filter["owners"] = {"$elemMatch": owner.mongo_filter()}
+    filter = token_layout.token_filter(
+        contract=collection.mongo_filter() if collection is not UNSET else None,
+        owner=owner.mongo_filter() if owner is not UNSET else None,
+        legacy=info.context.legacy_tokens,
+    )
 
     order_direction = OrderDirection.ASC
 
@@ -94,6 +94,7 @@ def get_tokens(
 @dataclass
 class TokensByAddressTokenIdLoader:
     db: Database
+    legacy: bool = True
 
     async def __call__(self, tokens_addr_id: List[Tuple[Address, TokenId]]):
         # group by contract address since it's not possible to query
@@ -107,13 +108,16 @@ class TokensByAddressTokenIdLoader:
         result = dict()
         for addr, token_ids in by_addr.items():
             tokens = self.db["tokens"].find(
-                {"contract_address": addr, "token_id": {"$in": token_ids}}
+                token_layout.token_filter(
+                    contract=addr, token_id={"$in": token_ids}, legacy=self.legacy
+                )
             )
             for token in tokens:
+                token = token_layout.from_document(token)
                 result[addr, token["token_id"]] = token
 
         return [result[addr, token_id] for addr, token_id in tokens_addr_id]
 
 
-def tokens_by_address_token_id_loader(db):
-    return DataLoader(TokensByAddressTokenIdLoader(db))
+def tokens_by_address_token_id_loader(db, cache=True, legacy=True):
+    return DataLoader(TokensByAddressTokenIdLoader(db, legacy), cache=cache)
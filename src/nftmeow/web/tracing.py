@@ -0,0 +1,260 @@
+"""Opt-in tracing of GraphQL requests and slow MongoDB queries.
+
+`ResolverTracer` times every resolver and, through the `RequestTrace` in the
+request context, every DataLoader batch. Timings are returned in the `timing`
+response extension and requests slower than the threshold are logged.
+
+`SlowQueryLogger` is a pymongo command listener that logs queries slower
+than the threshold with the shape of their filter (values replaced by `?`).
+A sample of them is explained in the background and the winning plan logged.
+"""
+
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isawaitable
+from logging import getLogger
+from typing import Any, Dict, Optional, Type
+
+from graphql import GraphQLResolveInfo
+from pymongo import MongoClient, monitoring
+from strawberry.dataloader import DataLoader
+from strawberry.extensions import Extension
+
+logger = getLogger(__name__)
+
+DEFAULT_SLOW_MS = 100
+DEFAULT_EXPLAIN_SAMPLE_RATE = 0.1
+
+# Commands that can be explained, with the fields describing the query.
+_EXPLAINABLE_COMMANDS = {
+    "find": ("filter", "sort"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("query",),
+}
+
+
+class RequestTrace:
+    """Time spent in resolvers and DataLoader batches during a request."""
+
+    def __init__(self):
+        self.resolvers: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+        self.batches: Dict[str, list] = defaultdict(lambda: [0, 0, 0.0])
+
+    def record_resolver(self, field: str, elapsed: float):
+        stats = self.resolvers[field]
+        stats[0] += 1
+        stats[1] += elapsed
+
+    def record_batch(self, loader: str, keys: int, elapsed: float):
+        stats = self.batches[loader]
+        stats[0] += 1
+        stats[1] += keys
+        stats[2] += elapsed
+
+    def trace_loader(self, name: str, loader: DataLoader) -> DataLoader:
+        """Time the batches of `loader`."""
+        load_fn = loader.load_fn
+
+        async def traced_load_fn(keys):
+            start = time.perf_counter()
+            try:
+                return await load_fn(keys)
+            finally:
+                self.record_batch(name, len(keys), time.perf_counter() - start)
+
+        loader.load_fn = traced_load_fn
+        return loader
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "resolvers": {
+                field: {"count": count, "ms": _ms(elapsed)}
+                for field, (count, elapsed) in self.resolvers.items()
+            },
+            "loaders": {
+                loader: {"batches": count, "keys": keys, "ms": _ms(elapsed)}
+                for loader, (count, keys, elapsed) in self.batches.items()
+            },
+        }
+
+    def summary(self, limit: int = 5) -> str:
+        timings = [
+            (elapsed, f"{field} x{count}")
+            for field, (count, elapsed) in self.resolvers.items()
+        ]
+        timings.extend(
+            (elapsed, f"{loader} loader x{count} ({keys} keys)")
+            for loader, (count, keys, elapsed) in self.batches.items()
+        )
+        timings.sort(reverse=True)
+        return ", ".join(
+            f"{name} {_ms(elapsed)} ms" for elapsed, name in timings[:limit]
+        )
+
+
+class ResolverTracer(Extension):
+    """Time resolvers and DataLoader batches, log requests over `slow_ms`.
+
+    Loaders are timed only if the context has a `trace` (see
+    `RequestTrace.trace_loader`). Nested resolvers run concurrently, so their
+    times overlap and don't add up to the execution time.
+    """
+
+    slow_ms: float = DEFAULT_SLOW_MS
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self._start = None
+        self._elapsed = None
+
+    def on_executing_start(self):
+        self._start = time.perf_counter()
+
+    def on_executing_end(self):
+        self._elapsed = time.perf_counter() - self._start
+        trace = self._trace()
+        if trace is None or _ms(self._elapsed) < self.slow_ms:
+            return
+        ctx = self.execution_context
+        logger.warning(
+            f"slow request {ctx.operation_name or 'anonymous'} "
+            f"{_ms(self._elapsed)} ms: {trace.summary()}"
+        )
+
+    def resolve(self, _next, root, info: GraphQLResolveInfo, *args, **kwargs):
+        trace = self._trace()
+        if trace is None:
+            return _next(root, info, *args, **kwargs)
+
+        field = f"{info.parent_type.name}.{info.field_name}"
+        start = time.perf_counter()
+        result = _next(root, info, *args, **kwargs)
+        if isawaitable(result):
+            return self._await_resolver(trace, field, start, result)
+        trace.record_resolver(field, time.perf_counter() - start)
+        return result
+
+    def get_results(self) -> Dict[str, Any]:
+        trace = self._trace()
+        if trace is None or self._elapsed is None:
+            return {}
+        return {"timing": {"executionMs": _ms(self._elapsed), **trace.to_json()}}
+
+    async def _await_resolver(self, trace, field, start, result):
+        try:
+            return await result
+        finally:
+            trace.record_resolver(field, time.perf_counter() - start)
+
+    def _trace(self) -> Optional[RequestTrace]:
+        return getattr(self.execution_context.context, "trace", None)
+
+
+def resolver_tracer(slow_ms: float) -> Type[ResolverTracer]:
+    """Create a `ResolverTracer` extension with the given threshold."""
+    return type("ResolverTracer", (ResolverTracer,), {"slow_ms": slow_ms})
+
+
+class SlowQueryLogger(monitoring.CommandListener):
+    """Log MongoDB queries slower than `slow_ms`, explaining a sample of them.
+
+    Set `client` to the client the listener is registered with to enable
+    explain. At most one explain runs at a time, others are skipped.
+    """
+
+    def __init__(
+        self,
+        slow_ms: float = DEFAULT_SLOW_MS,
+        explain_sample_rate: float = DEFAULT_EXPLAIN_SAMPLE_RATE,
+    ):
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.client: Optional[MongoClient] = None
+        self._commands: Dict[int, dict] = dict()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._explaining = False
+
+    def started(self, event):
+        if event.command_name in _EXPLAINABLE_COMMANDS:
+            self._commands[event.request_id] = event.command
+
+    def succeeded(self, event):
+        command = self._commands.pop(event.request_id, None)
+        if command is None or event.duration_micros < self.slow_ms * 1_000:
+            return
+
+        fields = _EXPLAINABLE_COMMANDS[event.command_name]
+        shape = {
+            field: query_shape(command[field]) for field in fields if field in command
+        }
+        if "sort" in shape:
+            shape["sort"] = command["sort"]
+        logger.warning(
+            f"slow {event.command_name} on {event.database_name}."
+            f"{command[event.command_name]} {event.duration_micros / 1_000:.1f} ms: "
+            f"{shape}"
+        )
+
+        if self.client is None or self._explaining:
+            return
+        if random.random() >= self.explain_sample_rate:
+            return
+        self._explaining = True
+        self._executor.submit(self._explain, event.database_name, command)
+
+    def failed(self, event):
+        self._commands.pop(event.request_id, None)
+
+    def _explain(self, database_name: str, command: dict):
+        # Drop session and read preference fields added by the driver.
+        command = {
+            k: v for k, v in command.items() if not k.startswith("$") and k != "lsid"
+        }
+        try:
+            explain = self.client[database_name].command(
+                "explain", command, verbosity="executionStats"
+            )
+            logger.warning(f"explain {command}: {explain_summary(explain)}")
+        except Exception:
+            logger.exception("explain failed")
+        finally:
+            self._explaining = False
+
+
+def query_shape(value: Any) -> Any:
+    """Replace the values in a query with `?`, keeping keys and operators."""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, list) and any(isinstance(v, dict) for v in value):
+        return [query_shape(v) for v in value]
+    return "?"
+
+
+def explain_summary(explain: dict) -> str:
+    """Summarize the winning plan and execution stats of an explain."""
+    plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # Plans executed by the slot based engine are nested in `queryPlan`.
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if "indexName" in plan:
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage")
+
+    stats = explain.get("executionStats", {})
+    return (
+        f"{' <- '.join(stages) or 'unknown plan'} "
+        f"returned={stats.get('nReturned')} "
+        f"keys={stats.get('totalKeysExamined')} "
+        f"docs={stats.get('totalDocsExamined')} "
+        f"time={stats.get('executionTimeMillis')} ms"
+    )
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1_000, 3)
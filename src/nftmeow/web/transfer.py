@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import AsyncGenerator, List, Optional
 
 import strawberry
 from pymongo.database import Database
@@ -71,10 +71,10 @@ def get_transfers(
         filter["from"] = from_address.mongo_filter()
 
     if to_address is not UNSET:
-        filter["to"] = from_address.mongo_filter()
+        filter["to"] = to_address.mongo_filter()
 
     if collection is not UNSET:
-        filter["contract_address"] = from_address.mongo_filter()
+        filter["contract_address"] = collection.mongo_filter()
 
     if after is not UNSET:
         filter["_id"] = order_direction.mongo_after_cursor(after)
@@ -101,3 +101,26 @@ def get_transfers(
     )
 
     return Connection(page_info=page_info, edges=edges[:-1])
+
+
+async def new_transfers(
+    info: Info,
+    collection: Optional[Filter[Address]] = UNSET,
+    owner: Optional[Filter[Address]] = UNSET,
+) -> AsyncGenerator[Transfer, None]:
+    """Stream transfers as they are indexed.
+
+    The `owner` filter matches transfers either from or to the address.
+    """
+    async with info.context.transfer_feed.subscribe() as queue:
+        while True:
+            transfer = await queue.get()
+            if collection is not UNSET and not collection.matches(
+                transfer["contract_address"]
+            ):
+                continue
+            if owner is not UNSET and not (
+                owner.matches(transfer["from"]) or owner.matches(transfer["to"])
+            ):
+                continue
+            yield Transfer.from_mongo(transfer)
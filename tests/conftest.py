@@ -0,0 +1,57 @@
+"""Fakes shared by the tests."""
+
+from typing import Iterable, Optional
+
+from mongomock.filtering import filter_applies
+from pymongo import ASCENDING
+
+
+def address(n: int) -> bytes:
+    return n.to_bytes(32, "big")
+
+
+def _sorted(docs: list, key_or_list, direction=ASCENDING) -> list:
+    keys = key_or_list
+    if isinstance(key_or_list, str):
+        keys = [(key_or_list, direction)]
+    # Sort by the last key first, stable sorts keep the order of the others.
+    for key, key_direction in reversed(keys):
+        docs = sorted(docs, key=lambda d: d[key], reverse=key_direction < 0)
+    return docs
+
+
+class FakeCursor(list):
+    def sort(self, key_or_list, direction=ASCENDING):
+        return FakeCursor(_sorted(self, key_or_list, direction))
+
+    def limit(self, limit: int):
+        return FakeCursor(self[:limit])
+
+    def batch_size(self, _size: int):
+        return self
+
+
+class FakeCollection:
+    """A collection of `docs` that records the filters of `find`.
+
+    Filters are matched like MongoDB does, projections are ignored.
+    """
+
+    def __init__(self, docs: Iterable[dict] = ()):
+        self.docs = list(docs)
+        self.filters = []
+
+    @property
+    def queries(self) -> int:
+        return len(self.filters)
+
+    def find(self, filter: Optional[dict] = None, _projection=None):
+        filter = filter or {}
+        self.filters.append(filter)
+        return FakeCursor(d for d in self.docs if filter_applies(filter, d))
+
+    def find_one(self, filter: Optional[dict] = None, _projection=None, sort=None):
+        docs = [d for d in self.docs if filter_applies(filter or {}, d)]
+        if sort is not None:
+            docs = _sorted(docs, sort)
+        return docs[0] if docs else None
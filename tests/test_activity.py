@@ -0,0 +1,52 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import strawberry
+
+from nftmeow.activity import bucket_start
+from nftmeow.web import Query
+from tests.conftest import FakeCollection, address
+
+
+def _execute(query, db):
+    schema = strawberry.Schema(query=Query)
+    return schema.execute_sync(query, context_value=SimpleNamespace(db=db))
+
+
+def test_mints_are_paginated_by_event_key():
+    ts = datetime(2022, 7, 1, 12, 30)
+    mints = [
+        {
+            "contract_address": address(1),
+            "token_id": address(i),
+            "to": address(2),
+            "created_at": ts,
+            "event_key": key,
+        }
+        for i, key in enumerate([30, 20, 10])
+    ]
+    db = {"mints": FakeCollection(mints)}
+    result = _execute(
+        """
+        {
+          mints(first: 2, after: "40") {
+            edges { cursor }
+            pageInfo { hasNextPage endCursor }
+          }
+        }
+        """,
+        db,
+    )
+
+    assert result.errors is None
+    assert db["mints"].filters == [{"event_key": {"$lt": 40}}]
+    assert result.data["mints"] == {
+        "edges": [{"cursor": "30"}, {"cursor": "20"}],
+        "pageInfo": {"hasNextPage": True, "endCursor": "20"},
+    }
+
+
+def test_bucket_start():
+    ts = datetime(2022, 7, 1, 12, 30, 5)
+    assert bucket_start(ts, "hour") == datetime(2022, 7, 1, 12)
+    assert bucket_start(ts, "day") == datetime(2022, 7, 1)
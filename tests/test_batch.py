@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import ReplaceOne, UpdateOne
+
+from nftmeow.indexer.batch import BlockBatch, event_key
+from tests.conftest import address
+
+
+class _Collection:
+    def __init__(self, doc=None):
+        self._doc = doc
+        self.writes = []
+
+    def find_one(self, _filter):
+        return self._doc
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        self.writes.append(list(requests))
+
+    def count_documents(self, filter, session=None):
+        # All the receivers written in the block are new.
+        bucket = {k: v for k, v in filter.items() if k != "first_block"}
+        return sum(op._filter.items() >= bucket.items() for op in self.writes[-1])
+
+
+def _db(token=None):
+    db = defaultdict(_Collection)
+    db["tokens"] = _Collection(token)
+    return db
+
+
+def test_event_key_is_ordered_by_block_then_index():
+    assert event_key(10, 1) < event_key(10, 2) < event_key(11, 0)
+
+
+def test_new_token_transferred_twice_in_block():
+    db = _db()
+    ts = datetime.fromtimestamp(1_650_000_000)
+    batch = BlockBatch(db, 100)
+    assert batch.transfer_token(address(1), address(7), address(2), ts, 0) is None
+    previous = batch.transfer_token(address(1), address(7), address(3), ts, 1)
+    assert previous["o"] == address(2)
+    batch.commit()
+
+    (metadata,) = db["token_metadata"].writes
+    assert len(metadata) == 1
+    (tokens,) = db["tokens"].writes
+    assert [(op._filter, op._doc["f"], op._doc["v"]) for op in tokens] == [
+        ({"k": event_key(100, 0)}, 100, 100),
+        ({"k": event_key(100, 1)}, 100, None),
+    ]
+    assert db["transfers"].writes == []
+
+
+def test_existing_token_is_invalidated_in_both_layouts():
+    db = _db({"_id": 1, "contract_address": address(1)})
+    ts = datetime.fromtimestamp(1_650_000_000)
+    batch = BlockBatch(db, 100)
+    batch.transfer_token(address(1), address(7), address(3), ts, 4)
+    batch.add_transfer(address(1), address(7), address(2), address(3), ts, 4)
+    batch.commit()
+    # Committing again, like after a restart, writes the same documents.
+    batch.commit()
+
+    assert db["token_metadata"].writes == []
+    first, second = db["tokens"].writes
+    assert first == second
+    assert first[:2] == [
+        UpdateOne({"_id": 1, "c": {"$exists": True}}, {"$set": {"v": 100}}),
+        UpdateOne(
+            {"_id": 1, "contract_address": {"$exists": True}},
+            {"$set": {"_chain.valid_to": 100}},
+        ),
+    ]
+    (transfer,) = db["transfers"].writes[0]
+    assert isinstance(transfer, ReplaceOne)
+    assert transfer._filter == {"event_key": event_key(100, 4)}
+
+
+def test_mints_and_activity_are_counted():
+    db = _db()
+    ts = datetime(2022, 7, 1, 12, 30)
+    batch = BlockBatch(db, 100)
+    batch.add_transfer(address(1), address(7), bytes(32), address(2), ts, 0)
+    batch.add_transfer(address(1), address(7), address(2), address(3), ts, 1)
+    batch.commit()
+
+    (mints,) = db["mints"].writes
+    assert [m._filter for m in mints] == [{"event_key": event_key(100, 0)}]
+
+    (activity,) = db["activity"].writes
+    # an upsert and an update for both the hour and the day
+    assert len(activity) == 4
+    hour = activity[1]
+    assert hour._filter == {
+        "contract_address": address(1),
+        "period": "hour",
+        "start": datetime(2022, 7, 1, 12),
+        "last_block": {"$lt": 100},
+    }
+    assert hour._doc["$inc"] == {"mints": 1, "transfers": 2, "unique_receivers": 2}
+
+    (receivers,) = db["activity_receivers"].writes
+    assert sorted(
+        op._filter["receiver"] for op in receivers if op._filter["period"] == "hour"
+    ) == [address(2), address(3)]
+    assert receivers[0]._doc == {"$min": {"first_block": 100}}
@@ -0,0 +1,58 @@
+import strawberry
+
+from nftmeow.web import Query
+from nftmeow.web.cost import query_cost_limiter
+
+NESTED_TRANSFERS = """
+{
+  transfers(first: 200) {
+    edges { node { fromAddress token { tokenId collection { name } } } }
+  }
+}
+"""
+
+
+def _schema(max_cost):
+    return strawberry.Schema(query=Query, extensions=[query_cost_limiter(max_cost)])
+
+
+def test_nested_query_cost_multiplies_first():
+    result = _schema(1).execute_sync(NESTED_TRANSFERS)
+
+    assert result.data is None
+    assert result.errors[0].message == "query cost 801 is over the maximum of 1"
+    assert result.extensions["cost"] == {"requested": 801, "maximum": 1}
+
+
+def test_aliases_and_variables_are_counted():
+    query = """
+    query Tokens($first: Int!) {
+      a: tokens(first: $first) { edges { node { collection { name } } } }
+      b: tokens(first: $first) { edges { node { collection { name } } } }
+    }
+    """
+    result = _schema(100).execute_sync(query, variable_values={"first": 50})
+
+    assert result.extensions["cost"]["requested"] == 2 * (1 + 50 * 3)
+    assert result.errors is not None
+
+
+def test_cheap_query_is_executed():
+    result = _schema(1).execute_sync("{ __typename }")
+
+    assert result.errors is None
+    assert result.data == {"__typename": "Query"}
+    assert result.extensions["cost"]["requested"] == 0
+
+
+def test_invalid_variables_are_reported_by_execution():
+    query = """
+    query Tokens($first: Int!) {
+      tokens(first: $first) { edges { node { collection { name } } } }
+    }
+    """
+    result = _schema(100).execute_sync(query, variable_values={"first": "abc"})
+
+    assert result.data is None
+    assert "$first" in result.errors[0].message
+    assert "cost" not in result.extensions
@@ -0,0 +1,61 @@
+import asyncio
+from contextlib import AsyncExitStack
+
+import pytest
+from bson import ObjectId
+
+from nftmeow.web.feed import TransferFeed
+from tests.conftest import FakeCollection
+
+
+@pytest.mark.asyncio
+async def test_transfer_feed_fans_out_single_poll():
+    transfers = FakeCollection()
+    transfers.docs.append({"_id": ObjectId(), "to": b"old"})
+    feed = TransferFeed({"transfers": transfers}, poll_interval=0.01)
+
+    async with feed.subscribe() as first, feed.subscribe() as second:
+        await asyncio.sleep(0.05)
+        transfers.docs.append({"_id": ObjectId(), "to": b"new"})
+
+        received = await asyncio.wait_for(
+            asyncio.gather(first.get(), second.get()), timeout=1
+        )
+
+    assert [t["to"] for t in received] == [b"new", b"new"]
+
+
+class _Clock:
+    """Replaces `asyncio.sleep`, so that the test decides when the feed polls."""
+
+    def __init__(self):
+        self.sleeping = asyncio.Queue()
+        self.ticks = asyncio.Queue()
+
+    async def sleep(self, _delay):
+        self.sleeping.put_nowait(None)
+        await self.ticks.get()
+
+
+async def _count_queries(monkeypatch, subscribers: int, ticks: int = 5) -> int:
+    transfers = FakeCollection()
+    feed = TransferFeed({"transfers": transfers})
+    clock = _Clock()
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+
+    async with AsyncExitStack() as stack:
+        for _ in range(subscribers):
+            await stack.enter_async_context(feed.subscribe())
+        for _ in range(ticks):
+            await clock.sleeping.get()
+            clock.ticks.put_nowait(None)
+        await clock.sleeping.get()
+        return transfers.queries
+
+
+@pytest.mark.asyncio
+async def test_polling_is_independent_of_subscribers(monkeypatch):
+    one = await _count_queries(monkeypatch, subscribers=1)
+    many = await _count_queries(monkeypatch, subscribers=50)
+
+    assert one == many == 6
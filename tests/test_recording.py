@@ -0,0 +1,122 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from apibara.model import Event
+
+from apibara import Info, NewEvents
+from nftmeow.indexer.batch import BlockBatch
+from nftmeow.indexer.indexer import NftIndexer
+from nftmeow.indexer.recording import (EventRecorder, ReplayError,
+                                       ReplayRpcClient, read_blocks,
+                                       read_contracts)
+
+
+def _message(block_number: int) -> NewEvents:
+    event = Event(
+        name="Transfer",
+        address=b"\x01" * 32,
+        block_index=3,
+        topics=[b"\x99"],
+        data=[b"\x00", b"\x01", b"\x10", b"\x00"],
+    )
+    return NewEvents(block_number.to_bytes(32, "big"), block_number, [event])
+
+
+def test_record_and_read_blocks(tmp_path):
+    recorder = EventRecorder(str(tmp_path), segment_blocks=10)
+    for block_number in range(5, 25):
+        recorder.record_block(_message(block_number), 1_650_000_000 + block_number)
+    # redelivered after a restart
+    recorder.record_block(_message(24), 1_650_000_024)
+    recorder.record_contract(b"\x01" * 32, {"type": "erc721", "name": "Meow"})
+    recorder.close()
+
+    blocks = list(read_blocks(str(tmp_path)))
+    assert [m.block_number for m, _ in blocks] == list(range(5, 25))
+
+    message, accepted_time = blocks[0]
+    assert accepted_time == 1_650_000_005
+    assert message.events == _message(5).events
+
+    selected = read_blocks(str(tmp_path), from_block=12, to_block=17)
+    assert [m.block_number for m, _ in selected] == list(range(12, 18))
+
+    assert list(read_contracts(str(tmp_path))) == [
+        (b"\x01" * 32, {"type": "erc721", "name": "Meow"})
+    ]
+
+
+def test_incomplete_record_is_discarded(tmp_path):
+    recorder = EventRecorder(str(tmp_path))
+    recorder.record_block(_message(1), 1_650_000_001)
+    recorder.close()
+
+    # simulate a crash while writing the next record
+    (segment,) = [f for f in os.listdir(tmp_path) if f.startswith("events-")]
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b"\x00\x00\x01\x00partial")
+
+    assert [m.block_number for m, _ in read_blocks(str(tmp_path))] == [1]
+
+    recorder = EventRecorder(str(tmp_path))
+    recorder.record_block(_message(2), 1_650_000_002)
+    recorder.close()
+
+    assert [m.block_number for m, _ in read_blocks(str(tmp_path))] == [1, 2]
+
+
+def test_rollback_removes_orphaned_blocks(tmp_path):
+    recorder = EventRecorder(str(tmp_path), segment_blocks=10)
+    for block_number in range(5, 25):
+        recorder.record_block(_message(block_number), 1_650_000_000 + block_number)
+    recorder.rollback(18)
+    # the new chain
+    for block_number in range(18, 22):
+        recorder.record_block(_message(block_number), 1_650_001_000 + block_number)
+    recorder.close()
+
+    blocks = list(read_blocks(str(tmp_path)))
+    assert [m.block_number for m, _ in blocks] == list(range(5, 22))
+    assert [t for _, t in blocks[-4:]] == [1_650_001_018 + i for i in range(4)]
+
+
+def test_classified_contracts_are_recorded_once(tmp_path):
+    recorder = EventRecorder(str(tmp_path))
+    recorder.record_contract(b"\x01" * 32, {"type": "erc721", "name": "Meow"})
+    recorder.close()
+
+    stored = [
+        (b"\x01" * 32, {"_id": 1, "contract_address": b"\x01" * 32, "type": "erc721"}),
+        (b"\x02" * 32, {"_id": 2, "contract_address": b"\x02" * 32, "type": "other"}),
+    ]
+    EventRecorder(str(tmp_path), contracts=stored).close()
+    EventRecorder(str(tmp_path), contracts=stored).close()
+
+    assert list(read_contracts(str(tmp_path))) == [
+        (b"\x01" * 32, {"type": "erc721", "name": "Meow"}),
+        (b"\x02" * 32, {"type": "other"}),
+    ]
+
+
+class _NoContracts:
+    def get(self, address):
+        return None
+
+    def set(self, address, contract):
+        raise AssertionError("replay must not classify contracts")
+
+
+def test_replay_stops_on_contract_not_recorded():
+    indexer = NftIndexer(None, None, "test")
+    indexer._contract_storage = _NoContracts()
+    info = Info(context=None, rpc_client=ReplayRpcClient())
+    (event,) = _message(1).events
+
+    with pytest.raises(ReplayError):
+        asyncio.run(
+            indexer._handle_transfer_event(
+                info, BlockBatch(None, 1), datetime.now(), event
+            )
+        )
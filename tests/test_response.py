@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from nftmeow.web import response as response_module
+from nftmeow.web.response import (MIN_COMPRESS_SIZE, accepted_encodings,
+                                  compression_middleware, encode_json)
+from nftmeow.web.scalar import _serialize_address
+
+
+def test_encode_json_is_compact():
+    data = {"data": {"tokens": [{"tokenId": "0x01"}]}}
+    assert json.loads(encode_json(data)) == data
+    assert b" " not in encode_json(data)
+
+
+def test_serialize_address_is_memoized():
+    addr = (1234).to_bytes(32, "big")
+    assert _serialize_address(addr) == "0x" + addr.hex()
+    assert _serialize_address(addr) is _serialize_address(addr)
+
+
+def _handler_with_body(body: bytes):
+    async def handler(_request):
+        return web.Response(body=body, content_type="application/json")
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_compression_middleware_skips_small_responses():
+    request = make_mocked_request(
+        "POST", "/graphql", headers={"Accept-Encoding": "gzip"}
+    )
+    handler = _handler_with_body(b"{}")
+    response = await compression_middleware(request, handler)
+    assert response.compression is False
+
+
+@pytest.mark.asyncio
+async def test_compression_middleware_compresses_large_responses():
+    request = make_mocked_request(
+        "POST", "/graphql", headers={"Accept-Encoding": "gzip"}
+    )
+    handler = _handler_with_body(b"0" * (MIN_COMPRESS_SIZE + 1))
+    response = await compression_middleware(request, handler)
+    assert response.compression
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_accept_encoding_qualities():
+    assert accepted_encodings("gzip, br;q=0, deflate;q=0.5") == {
+        "gzip": 1.0,
+        "br": 0.0,
+        "deflate": 0.5,
+    }
+
+
+@pytest.mark.asyncio
+async def test_compression_middleware_honours_zero_quality(monkeypatch):
+    monkeypatch.setattr(response_module, "brotli", object())
+    request = make_mocked_request(
+        "POST", "/graphql", headers={"Accept-Encoding": "br;q=0, gzip"}
+    )
+    handler = _handler_with_body(b"0" * (MIN_COMPRESS_SIZE + 1))
+    response = await compression_middleware(request, handler)
+    assert "Content-Encoding" not in response.headers
+    assert response.compression
+
+    request = make_mocked_request(
+        "POST", "/graphql", headers={"Accept-Encoding": "*;q=0"}
+    )
+    response = await compression_middleware(request, handler)
+    assert not response.compression
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import mongomock
+
+from nftmeow import activity, token_layout
+from nftmeow.indexer import indexer as indexer_module
+from nftmeow.indexer.batch import BlockBatch
+from nftmeow.indexer.indexer import NftIndexer
+from nftmeow.indexer.rollback import rollback
+from tests.conftest import address
+
+ZERO_ADDRESS = bytes(32)
+
+
+def _legacy_token(token_id: int, owner: int, valid_from: int, valid_to=None) -> dict:
+    return {
+        "contract_address": address(1),
+        "token_id": address(token_id),
+        "updated_at": datetime(2022, 7, 1),
+        "owners": [address(owner)],
+        "_chain": {"valid_from": valid_from, "valid_to": valid_to},
+    }
+
+
+def _index_block(db, block_number, transfers):
+    ts = datetime(2022, 7, 1, 12, block_number - 100)
+    batch = BlockBatch(db, block_number)
+    for event_index, (token_id, from_address, to_address) in enumerate(transfers):
+        token_id, to_address = address(token_id), address(to_address)
+        batch.transfer_token(address(1), token_id, to_address, ts, event_index)
+        batch.add_transfer(
+            address(1), token_id, from_address, to_address, ts, event_index
+        )
+    batch.commit()
+
+
+def test_rollback_restores_the_previous_state():
+    db = mongomock.MongoClient()["nftmeow"]
+    activity.create_indexes(db)
+    # Indexed with the v1 layout: token 1 is still valid, token 2 was
+    # transferred in a block that will be rolled back.
+    db["tokens"].insert_many(
+        [
+            _legacy_token(1, owner=10, valid_from=50),
+            _legacy_token(2, owner=10, valid_from=60, valid_to=115),
+            _legacy_token(2, owner=11, valid_from=115),
+        ]
+    )
+
+    _index_block(db, 100, [(1, address(10), 12)])
+    _index_block(db, 110, [(3, ZERO_ADDRESS, 13)])
+    _index_block(db, 120, [(3, address(13), 14), (4, ZERO_ADDRESS, 15)])
+
+    counts = rollback(db, 115)
+
+    assert counts["tokens_deleted"] == 3
+    assert counts["tokens_reopened"] == 2
+    assert counts["transfers_deleted"] == 2
+    assert counts["mints_deleted"] == 1
+    tokens = map(
+        token_layout.from_document,
+        db["tokens"].find(token_layout.token_filter(current=True)),
+    )
+    owners = {t["token_id"]: t["owners"][-1] for t in tokens}
+    # token 2 is reopened in the v1 layout, token 3 in the v2 layout
+    assert owners == {
+        address(1): address(12),
+        address(2): address(10),
+        address(3): address(13),
+    }
+
+    assert sorted(t["_chain"]["valid_from"] for t in db["transfers"].find()) == [
+        100,
+        110,
+    ]
+    assert [m["_chain"]["valid_from"] for m in db["mints"].find()] == [110]
+
+    hour = db["activity"].find_one({"period": "hour"})
+    assert hour["transfers"] == 2
+    assert hour["mints"] == 1
+    assert hour["unique_receivers"] == 2
+    assert hour["last_block"] == 110
+
+
+class _Storage:
+    def __init__(self):
+        self.invalidated = False
+
+    def invalidate(self):
+        self.invalidated = True
+
+
+class _Recorder:
+    def __init__(self):
+        self.rolled_back_to = None
+
+    def rollback(self, block_number):
+        self.rolled_back_to = block_number
+
+
+def test_rollback_invalidates_caches(monkeypatch):
+    calls = []
+
+    def rollback(db, block_number, legacy):
+        calls.append((db, block_number, legacy))
+        return dict()
+
+    monkeypatch.setattr(indexer_module, "rollback", rollback)
+    indexer = NftIndexer(None, None, "test")
+    indexer._db = db = object()
+    indexer._contract_storage = _Storage()
+    indexer._recorder = _Recorder()
+
+    indexer.rollback(250_000)
+
+    assert calls == [(db, 250_000, True)]
+    assert indexer._contract_storage.invalidated
+    assert indexer._recorder.rolled_back_to == 250_000
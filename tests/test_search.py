@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from nftmeow.web.search import CollectionSearchIndex
+from tests.conftest import FakeCollection, address
+
+
+def _contract(n: int, name, type="erc721") -> dict:
+    return {
+        "_id": ObjectId(),
+        "contract_address": address(n),
+        "type": type,
+        "name": name,
+    }
+
+
+@pytest.mark.asyncio
+async def test_search_by_prefix_of_any_word():
+    contracts = FakeCollection(
+        [
+            _contract(1, "Meow Cats"),
+            _contract(2, "Cool Cats"),
+            _contract(3, "meowtopia"),
+            _contract(4, "Meow Coin", type="other"),
+            _contract(5, None),
+        ]
+    )
+    index = CollectionSearchIndex({"contracts": contracts})
+
+    results = await index.search("MEOW", 10)
+    assert [name for _, name in results] == ["Meow Cats", "meowtopia"]
+
+    results = await index.search("cats", 10)
+    assert sorted(name for _, name in results) == ["Cool Cats", "Meow Cats"]
+
+    assert await index.search("co", 1) == [(b"\x00" * 31 + b"\x02", "Cool Cats")]
+    assert await index.search("dog", 10) == []
+    # Loaded once, searches don't query MongoDB.
+    assert contracts.queries == 1
+
+    await index.close()
+    assert index._task is None
+
+
+def test_refresh_adds_new_collections():
+    contracts = FakeCollection([_contract(1, "Meow Cats")])
+    index = CollectionSearchIndex({"contracts": contracts})
+    index.refresh()
+
+    contracts.docs.append(_contract(2, "Meow Dogs"))
+    contracts.docs.extend(_contract(10 + i, f"Bulk {i:03d}") for i in range(100))
+    assert index.refresh() == 101
+
+    assert [name for _, name in index.find("meow", 10)] == ["Meow Cats", "Meow Dogs"]
+    assert len(index.find("bulk", 200)) == 100
+    assert index.refresh() == 0
+
+
+@pytest.mark.asyncio
+async def test_close_stops_polling():
+    contracts = FakeCollection([_contract(1, "Meow Cats")])
+    index = CollectionSearchIndex({"contracts": contracts}, poll_interval=0.01)
+    await index.search("meow", 10)
+    task = index._task
+
+    await index.close()
+    assert task.cancelled()
+    queries = contracts.queries
+    await asyncio.sleep(0.05)
+    assert contracts.queries == queries
@@ -0,0 +1,99 @@
+from datetime import datetime
+from io import BytesIO
+
+from nftmeow.snapshot import (TABLE_COLLECTIONS, TABLE_TOKENS, TABLE_TRANSFERS,
+                              SnapshotExporter, read_snapshot)
+from tests.conftest import FakeCollection, address
+
+
+def test_export_and_read_snapshot():
+    ts = datetime.fromtimestamp(1_650_000_000)
+    chain = {"valid_from": 100, "valid_to": None}
+    db = {
+        "contracts": FakeCollection(
+            [
+                {"contract_address": address(1), "type": "erc721", "name": "Meow"},
+                {"contract_address": address(2), "type": "erc721", "name": None},
+                {"contract_address": address(3), "type": "other", "name": "Ether"},
+            ]
+        ),
+        "tokens": FakeCollection(
+            [
+                {
+                    "contract_address": address(1),
+                    "token_id": address(7),
+                    "owners": [address(42)],
+                    "updated_at": ts,
+                    "_chain": chain,
+                },
+                {
+                    "_id": 2,
+                    "c": address(2),
+                    "t": b"\x08",
+                    "o": address(43),
+                    "u": ts,
+                    "f": 101,
+                    "v": None,
+                },
+            ]
+        ),
+        "transfers": FakeCollection(
+            [
+                {
+                    "contract_address": address(1),
+                    "token_id": address(7),
+                    "from": address(0),
+                    "to": address(42),
+                    "created_at": ts,
+                    "_chain": chain,
+                }
+            ]
+        ),
+    }
+
+    out = BytesIO()
+    counts = SnapshotExporter(db, jobs=2).export(out)
+    assert counts == {"collections": 2, "tokens": 2, "transfers": 1}
+
+    out.seek(0)
+    frames = list(read_snapshot(out))
+    tokens_frames = {
+        frame.contract: frame for frame in frames if frame.table == TABLE_TOKENS
+    }
+    frames = {frame.table: frame for frame in frames}
+
+    collections = frames[TABLE_COLLECTIONS].columns
+    assert collections["address"] == [address(1), address(2)]
+    assert collections["name"] == ["Meow", None]
+
+    tokens = tokens_frames[address(1)].columns
+    assert tokens["owner"] == [address(42)]
+    assert tokens["updated_at"] == [1_650_000_000]
+
+    # compact layout
+    tokens = tokens_frames[address(2)].columns
+    assert tokens["token_id"] == [address(8)]
+    assert tokens["owner"] == [address(43)]
+    assert tokens["valid_from"] == [101]
+
+    transfers = frames[TABLE_TRANSFERS].columns
+    assert transfers["from"] == [address(0)]
+    assert transfers["valid_from"] == [100]
+
+
+def test_export_long_collection_names():
+    name = "Meow" * 20_000
+    db = {
+        "contracts": FakeCollection(
+            [{"contract_address": address(1), "type": "erc721", "name": name}]
+        ),
+        "tokens": FakeCollection(),
+        "transfers": FakeCollection(),
+    }
+    out = BytesIO()
+
+    SnapshotExporter(db).export(out)
+
+    out.seek(0)
+    frames = [f for f in read_snapshot(out) if f.table == TABLE_COLLECTIONS]
+    assert frames[0].columns == {"address": [address(1)], "name": [name]}
@@ -0,0 +1,66 @@
+import pytest
+from aiohttp.test_utils import TestServer
+
+from nftmeow.fake_starknet import FakeStarkNetRpc
+from nftmeow.indexer.erc721 import ERC721Contract, FeltTokenId
+from nftmeow.starknet_rpc import (CachedCallRpcClient, RpcError,
+                                  StarkNetRpcClient)
+
+ERC721_ADDRESS = "0x0266b1276d23ffb53d99da3f01be7e29fa024dd33cd7f7b1eb7a46c67891c9d0"
+ERC20_ADDRESS = "0x049d36570d4e46f48e99674bd3fcc84644ddd6b96f7c741b1562b82f9e004dc7"
+
+
+class _DictStorage(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+@pytest.mark.asyncio
+async def test_classify_contracts_with_cached_calls():
+    fake = FakeStarkNetRpc(
+        {
+            ERC721_ADDRESS: {"supportsInterface": ["0x1"], "name": ["0x4d656f77"]},
+            ERC20_ADDRESS: {"name": ["0x4574686572"]},
+        }
+    )
+    async with TestServer(fake.app()) as server:
+        url = str(server.make_url(""))
+        storage = _DictStorage()
+
+        async def classify(address):
+            rpc = CachedCallRpcClient(StarkNetRpcClient(url), storage)
+            contract = ERC721Contract(rpc, bytes.fromhex(address[2:]))
+            return await contract.is_erc721(FeltTokenId(1)), await contract.name()
+
+        assert await classify(ERC721_ADDRESS) == (True, "Meow")
+        assert await classify(ERC20_ADDRESS) == (False, "Ether")
+        requests = fake.requests
+
+        # Errors are cached too, nothing hits the node the second time.
+        assert await classify(ERC721_ADDRESS) == (True, "Meow")
+        assert await classify(ERC20_ADDRESS) == (False, "Ether")
+        assert fake.requests == requests
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_not_cached():
+    fake = FakeStarkNetRpc(
+        {ERC721_ADDRESS: {"name": {"error": "Internal error", "code": -32603}}}
+    )
+    async with TestServer(fake.app()) as server:
+        storage = _DictStorage()
+        rpc = CachedCallRpcClient(StarkNetRpcClient(str(server.make_url(""))), storage)
+        address = bytes.fromhex(ERC721_ADDRESS[2:])
+
+        for _ in range(2):
+            with pytest.raises(RpcError) as err:
+                await rpc.call(address, "name", [])
+            assert err.value.code == -32603
+        assert fake.requests == 2
+        assert storage == {}
+
+        # Missing entry points are cached.
+        for _ in range(2):
+            with pytest.raises(RpcError):
+                await rpc.call(address, "symbol", [])
+        assert fake.requests == 3
@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import mongomock
+
+from nftmeow import token_layout
+from tests.conftest import address
+
+
+def test_token_id_is_stored_without_padding():
+    assert token_layout.encode_token_id(address(0x1234)) == b"\x12\x34"
+    assert token_layout.encode_token_id(address(0)) == b"\x00"
+    assert token_layout.decode_token_id(b"\x12\x34") == address(0x1234)
+
+
+def test_documents_are_read_in_legacy_layout():
+    ts = datetime.fromtimestamp(1_650_000_000)
+    doc = token_layout.to_document(
+        address(1), address(7), address(42), ts, valid_from=10
+    )
+    doc["_id"] = "id"
+
+    assert token_layout.from_document(doc) == {
+        "_id": "id",
+        "contract_address": address(1),
+        "token_id": address(7),
+        "owners": [address(42)],
+        "updated_at": ts,
+        "_chain": {"valid_from": 10, "valid_to": None},
+    }
+    # legacy documents are returned unchanged
+    legacy = token_layout.from_document(doc)
+    assert token_layout.from_document(legacy) == legacy
+
+
+def test_token_filter():
+    owner = {"$eq": address(42)}
+    token_ids = {"$in": [address(7)]}
+
+    assert token_layout.token_filter(
+        contract=address(1), token_id=token_ids, owner=owner, legacy=False
+    ) == {"c": address(1), "t": {"$in": [b"\x07"]}, "o": owner}
+
+    assert token_layout.token_filter(owner=owner, current=True) == {
+        "$or": [
+            {"o": owner, "v": None, "c": {"$exists": True}},
+            {
+                "owners": {"$elemMatch": owner},
+                "_chain.valid_to": None,
+                "contract_address": {"$exists": True},
+            },
+        ]
+    }
+
+
+def _legacy_token(token_id: int, valid_to=None) -> dict:
+    return {
+        "contract_address": address(1),
+        "token_id": address(token_id),
+        "updated_at": datetime(2022, 7, 1),
+        "owners": [address(40), address(42)],
+        "_chain": {"valid_from": 10, "valid_to": valid_to},
+    }
+
+
+def test_migrate_rewrites_legacy_documents():
+    db = mongomock.MongoClient()["nftmeow"]
+    db["tokens"].insert_one(_legacy_token(7, valid_to=20))
+    assert not token_layout.is_migrated(db)
+
+    assert token_layout.migrate(db) == 1
+
+    (doc,) = db["tokens"].find({}, {"_id": 0})
+    assert doc == token_layout.to_document(
+        address(1), address(7), address(42), datetime(2022, 7, 1), 10, 20
+    )
+    assert token_layout.is_migrated(db)
+
+
+class _IndexedWhileMigrating:
+    """Tokens collection invalidated by the indexer during the first batch."""
+
+    def __init__(self, tokens, token_id: bytes):
+        self._tokens = tokens
+        self._token_id = token_id
+        self.indexed = False
+
+    def __getattr__(self, name):
+        return getattr(self._tokens, name)
+
+    def bulk_write(self, requests, ordered=True):
+        if not self.indexed:
+            self._tokens.update_one(
+                {"token_id": self._token_id}, {"$set": {"_chain.valid_to": 30}}
+            )
+            self.indexed = True
+        return self._tokens.bulk_write(requests, ordered=ordered)
+
+
+def test_migrate_skips_documents_changed_by_the_indexer():
+    db = mongomock.MongoClient()["nftmeow"]
+    db["tokens"].insert_many([_legacy_token(i) for i in range(1, 4)])
+    tokens = _IndexedWhileMigrating(db["tokens"], address(2))
+    batches = []
+
+    migrated = token_layout.migrate(
+        {"tokens": tokens, "migrations": db["migrations"]},
+        batch_size=3,
+        on_batch=batches.append,
+    )
+
+    # token 2 is skipped by the first batch, then migrated as updated
+    assert batches == [2, 3]
+    assert migrated == 3
+    assert db["tokens"].count_documents({"contract_address": {"$exists": True}}) == 0
+    token = db["tokens"].find_one({"t": b"\x02"})
+    assert token["v"] == 30
+    assert db["migrations"].find_one({"_id": "tokens"}) == {
+        "_id": "tokens",
+        "version": token_layout.LAYOUT_VERSION,
+    }
@@ -0,0 +1,106 @@
+import logging
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+import strawberry
+from strawberry.dataloader import DataLoader
+from strawberry.types import Info
+
+from nftmeow.web.tracing import (RequestTrace, SlowQueryLogger,
+                                 explain_summary, query_shape, resolver_tracer)
+
+
+async def _load_names(keys: List[int]) -> List[str]:
+    return [f"name {key}" for key in keys]
+
+
+@strawberry.type
+class Item:
+    id: int
+
+    @strawberry.field
+    async def name(self, info: Info) -> str:
+        return await info.context.loader.load(self.id)
+
+
+@strawberry.type
+class ItemQuery:
+    @strawberry.field
+    def items(self) -> List[Item]:
+        return [Item(id=i) for i in range(3)]
+
+
+@pytest.mark.asyncio
+async def test_resolvers_and_loader_batches_are_timed():
+    schema = strawberry.Schema(query=ItemQuery, extensions=[resolver_tracer(1_000)])
+    trace = RequestTrace()
+    loader = trace.trace_loader("name", DataLoader(_load_names))
+    context = SimpleNamespace(loader=loader, trace=trace)
+
+    result = await schema.execute("{ items { name } }", context_value=context)
+
+    assert result.errors is None
+    timing = result.extensions["timing"]
+    assert timing["resolvers"]["ItemQuery.items"]["count"] == 1
+    assert timing["resolvers"]["Item.name"]["count"] == 3
+    assert timing["loaders"]["name"]["batches"] == 1
+    assert timing["loaders"]["name"]["keys"] == 3
+
+
+def test_slow_query_is_logged_with_its_shape(caplog):
+    listener = SlowQueryLogger(slow_ms=10, explain_sample_rate=0)
+    command = {
+        "find": "tokens",
+        "filter": {"c": b"\x01", "$or": [{"v": None}, {"v": {"$gt": 10}}]},
+        "sort": {"_id": 1},
+    }
+    listener.started(
+        SimpleNamespace(command_name="find", request_id=1, command=command)
+    )
+    listener.started(
+        SimpleNamespace(command_name="find", request_id=2, command=command)
+    )
+
+    with caplog.at_level(logging.WARNING):
+        for request_id, duration in [(1, 5_000), (2, 50_000)]:
+            listener.succeeded(
+                SimpleNamespace(
+                    command_name="find",
+                    request_id=request_id,
+                    database_name="nftmeow",
+                    duration_micros=duration,
+                )
+            )
+
+    (record,) = caplog.records
+    assert "slow find on nftmeow.tokens 50.0 ms" in record.message
+    assert "'$or': [{'v': '?'}, {'v': {'$gt': '?'}}]" in record.message
+    assert "'sort': {'_id': 1}" in record.message
+
+
+def test_query_shape_hides_values():
+    assert query_shape({"o": {"$in": [b"\x01", b"\x02"]}}) == {"o": {"$in": "?"}}
+
+
+def test_explain_summary():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "LIMIT",
+                "inputStage": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "IXSCAN", "indexName": "o_1"},
+                },
+            }
+        },
+        "executionStats": {
+            "nReturned": 11,
+            "totalKeysExamined": 11,
+            "totalDocsExamined": 11,
+            "executionTimeMillis": 3,
+        },
+    }
+    assert explain_summary(explain) == (
+        "LIMIT <- FETCH <- IXSCAN(o_1) returned=11 keys=11 docs=11 time=3 ms"
+    )
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+import strawberry
+
+from nftmeow.web import Query
+from tests.conftest import FakeCollection, address
+
+
+def _execute(query, db):
+    schema = strawberry.Schema(query=Query)
+    return schema.execute_sync(query, context_value=SimpleNamespace(db=db))
+
+
+def test_transfers_filters_use_their_own_argument():
+    db = {"transfers": FakeCollection()}
+    result = _execute(
+        """
+        {
+          transfers(collection: { eq: "0x1" }, toAddress: { eq: "0x2" }) {
+            edges { cursor }
+          }
+        }
+        """,
+        db,
+    )
+
+    assert result.errors is None
+    assert db["transfers"].filters == [
+        {"to": {"$eq": address(2)}, "contract_address": {"$eq": address(1)}}
+    ]